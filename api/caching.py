@@ -0,0 +1,66 @@
+"""Conditional GET support for polled read endpoints.
+
+Routes build their validators from database.change_versions (one primary
+key lookup) before running their query:
+
+    headers = cache_headers(get_change_version(db, TABLES, clinic_id))
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    response.headers.update(headers)
+
+Clients revalidate every time (Cache-Control: no-cache) and get an empty
+304 while nothing the response depends on has changed. Responses that
+also depend on something other than the data, like "today", pass it as
+``extra``. There is no Last-Modified: at one second granularity it would
+report a write made in the same second as unmodified.
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.config import settings
+
+# Static data, e.g. the navigation menu: cache for an hour
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+
+
+def _etag(*parts: Any) -> str:
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def cache_headers(
+    change_version: Tuple[int, Optional[datetime]], *extra: Any
+) -> Dict[str, str]:
+    """ETag for a response built from the tables whose change version is
+    given."""
+    version, _ = change_version
+    return {
+        "ETag": _etag(settings.app_version, version, *extra),
+        "Cache-Control": "no-cache",
+    }
+
+
+def static_cache_headers(*content: Any) -> Dict[str, str]:
+    """Headers for data that only changes with a new app version."""
+    return {
+        "ETag": _etag(settings.app_version, *content),
+        "Cache-Control": STATIC_CACHE_CONTROL,
+    }
+
+
+def not_modified(request: Request, headers: Dict[str, str]) -> Optional[Response]:
+    """A 304 response if the client's If-None-Match has the current ETag,
+    else None."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    etag = headers["ETag"]
+    if "*" in tags or etag in tags or etag.removeprefix("W/") in tags:
+        return Response(status_code=304, headers=headers)
+    return None
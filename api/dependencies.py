@@ -1,8 +1,9 @@
+from app.database.async_db import async_local_db
 from app.database.local_db import local_db
 
 
-def get_db():
-    gen = local_db.get_db()
+def _yield_session(readonly: bool):
+    gen = local_db.get_db(readonly=readonly)
     session = next(gen)
     try:
         yield session
@@ -11,3 +12,18 @@ def get_db():
             next(gen)
         except StopIteration:
             pass
+
+
+def get_db():
+    yield from _yield_session(readonly=False)
+
+
+def get_read_db():
+    """Session on the read-only pool, for handlers that never write."""
+    yield from _yield_session(readonly=True)
+
+
+async def get_async_read_db():
+    """AsyncSession on the aiosqlite read engine (``async_db_enabled``)."""
+    async with async_local_db.get_session() as session:
+        yield session
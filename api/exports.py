@@ -0,0 +1,103 @@
+"""Streaming CSV and NDJSON exports.
+
+Export routes return ``export_response``: the body is generated while it
+is sent, ``export_chunk_size`` rows at a time, so memory stays flat however
+many rows are exported. Each chunk is a keyset query (a service
+``get_*_chunk`` method) in its own short read-only session, closed before
+the chunk is sent: a slow client holds no pooled read connection and no
+read transaction (which would keep WAL checkpoints from completing) while
+it downloads. Rows written between chunks may or may not be included, but
+no row is skipped or repeated.
+"""
+
+import csv
+import io
+from datetime import date, datetime
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database.local_db import local_db
+from .responses import dumps
+
+ExportFormat = Literal["csv", "ndjson"]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",  # Starlette adds "; charset=utf-8"
+    "ndjson": "application/x-ndjson",
+}
+
+# Lets Excel detect UTF-8 (Persian names); the bulk import reads utf-8-sig
+CSV_BOM = "\ufeff"
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _encode_csv(rows: Iterable[Sequence[Any]]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(rows: Iterable[Sequence[Any]], fields: List[str]) -> bytes:
+    return b"".join(dumps(dict(zip(fields, row))) + b"\n" for row in rows)
+
+
+ChunkReader = Callable[
+    [Session, Optional[Tuple], int], Tuple[List[Sequence[Any]], Optional[Tuple]]
+]
+
+
+def export_response(
+    rows: ChunkReader,
+    columns: Sequence,
+    fmt: ExportFormat,
+    filename: str,
+) -> StreamingResponse:
+    """Stream the rows read by ``rows(session, after, chunk_size)``, which
+    returns one chunk and the ``after`` of the next (None after the last),
+    with one field per entry of ``columns`` (named by its key), as a file
+    download."""
+    fields = [column.key for column in columns]
+    chunk_size = max(1, settings.export_chunk_size)
+
+    def body() -> Iterator[bytes]:
+        if fmt == "csv":
+            yield CSV_BOM.encode("utf-8") + _encode_csv([fields])
+        after = None
+        while True:
+            with local_db.get_session(readonly=True) as session:
+                chunk, after = rows(session, after, chunk_size)
+            if chunk:
+                if fmt == "csv":
+                    yield _encode_csv(chunk)
+                else:
+                    yield _encode_ndjson(chunk, fields)
+            if after is None:
+                return
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{fmt}"'
+        },
+    )
@@ -0,0 +1,14 @@
+from typing import Dict
+
+from fastapi import Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def set_page_headers(response: Response, page: Dict) -> None:
+    """Expose a service page's cursor/total as headers; the body stays a list."""
+    if page.get("next_cursor"):
+        response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+    if page.get("total") is not None:
+        response.headers[TOTAL_COUNT_HEADER] = str(page["total"])
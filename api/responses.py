@@ -0,0 +1,46 @@
+"""Fast JSON responses for large list endpoints.
+
+List routes select only the response columns and return plain dicts in a
+FastJSONResponse: FastAPI neither validates nor re-serializes a returned
+Response, so each row is built once instead of as an ORM object, a
+Pydantic model and then JSON. The route's response_model still documents
+the schema in OpenAPI.
+
+orjson encodes dates, datetimes and (through ``_default``) Decimals in C;
+without it, jsonable_encoder and the standard JSONResponse are used.
+"""
+
+import json
+from decimal import Decimal
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional speed-up, see requirements.txt
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON, as in a FastJSONResponse body."""
+    if orjson is None:
+        return json.dumps(
+            jsonable_encoder(content),
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,15 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from datetime import datetime, date
-from typing import List, Optional
+from datetime import datetime, date, time, timedelta
+from typing import Dict, List, Optional
 
 from app.database.local_db import local_db
-from app.services.appointment_service import AppointmentService
-from app.database.models import Appointment
-from app.api.dependencies import get_db
+from app.services.appointment_service import (
+    AppointmentService,
+    AsyncAppointmentService,
+)
+from app.database.models import Appointment, Patient
+from app.api.dependencies import get_async_read_db, get_db, get_read_db
+from app.api.exports import ExportFormat, export_response
+from app.api.pagination import set_page_headers
+from app.api.responses import FastJSONResponse
+from app.api.caching import cache_headers, not_modified
+from app.database.change_versions import get_change_version
 
 router = APIRouter()
+async_router = APIRouter()
 
 
 class AppointmentCreate(BaseModel):
@@ -47,6 +57,66 @@ class AppointmentResponse(BaseModel):
         )
 
 
+# Selected directly for lean list responses, see _appointment_list_response
+_APPOINTMENT_COLUMNS = (
+    Appointment.id,
+    Appointment.clinic_id,
+    Appointment.patient_id,
+    Appointment.appointment_date,
+    Appointment.status,
+    Appointment.visit_fee,
+    Appointment.duration_minutes,
+    Patient.first_name,
+    Patient.last_name,
+)
+
+
+# Exported fields: the list fields plus payment, with names split
+_EXPORT_COLUMNS = (
+    Appointment.id,
+    Appointment.clinic_id,
+    Appointment.patient_id,
+    Patient.first_name.label("patient_first_name"),
+    Patient.last_name.label("patient_last_name"),
+    Appointment.appointment_date,
+    Appointment.duration_minutes,
+    Appointment.status,
+    Appointment.visit_fee,
+    Appointment.paid_amount,
+    Appointment.payment_status,
+)
+
+
+# Tables a day's appointment list is built from (patient names included)
+DAY_LIST_TABLES = [Appointment.__tablename__, Patient.__tablename__]
+
+
+def _appointment_list_response(rows, page: Optional[Dict] = None) -> FastJSONResponse:
+    """AppointmentResponse dicts (same fields and order) from column rows."""
+    response = FastJSONResponse(
+        [
+            {
+                "id": row.id,
+                "clinic_id": row.clinic_id,
+                "patient_id": row.patient_id,
+                "appointment_date": row.appointment_date,
+                "status": row.status,
+                "visit_fee": float(row.visit_fee or 0),
+                "patient_name": (
+                    f"{row.first_name} {row.last_name}"
+                    if row.first_name is not None
+                    else None
+                ),
+                "duration_minutes": row.duration_minutes,
+            }
+            for row in rows
+        ]
+    )
+    if page is not None:
+        set_page_headers(response, page)
+    return response
+
+
 @router.post("/", response_model=AppointmentResponse)
 def create_appointment(
     appointment: AppointmentCreate, db: Session = Depends(get_db)
@@ -64,26 +134,91 @@ def create_appointment(
 
 @router.get("/date/{clinic_id}/{target_date}", response_model=List[AppointmentResponse])
 def get_appointments_by_date(
-    clinic_id: str, target_date: date, db: Session = Depends(get_db)
+    clinic_id: str,
+    target_date: date,
+    request: Request,
+    db: Session = Depends(get_read_db),
 ):
+    headers = cache_headers(get_change_version(db, DAY_LIST_TABLES, clinic_id))
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
     service = AppointmentService(db)
-    appointments = service.get_appointments_by_date(clinic_id, target_date)
-    return [AppointmentResponse.from_orm_with_patient(apt) for apt in appointments]
+    response = _appointment_list_response(
+        service.get_appointments_by_date(
+            clinic_id, target_date, columns=_APPOINTMENT_COLUMNS
+        )
+    )
+    response.headers.update(headers)
+    return response
 
 
 @router.get("/upcoming/{clinic_id}", response_model=List[AppointmentResponse])
 def get_upcoming_appointments(
-    clinic_id: str, days: int = 7, db: Session = Depends(get_db)
+    clinic_id: str, days: int = 7, db: Session = Depends(get_read_db)
+):
+    service = AppointmentService(db)
+    return _appointment_list_response(
+        service.get_upcoming_appointments(
+            clinic_id, days, columns=_APPOINTMENT_COLUMNS
+        )
+    )
+
+
+@router.get("/patient/{patient_id}", response_model=List[AppointmentResponse])
+def get_patient_appointments(
+    patient_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
 ):
+    """
+    A patient's appointments, newest first. Pass the X-Next-Cursor response
+    header back as ``cursor`` for the next page.
+    """
     service = AppointmentService(db)
-    appointments = service.get_upcoming_appointments(clinic_id, days)
-    return [AppointmentResponse.from_orm_with_patient(apt) for apt in appointments]
+    try:
+        page = service.get_patient_appointments_page(
+            patient_id,
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total,
+            columns=_APPOINTMENT_COLUMNS,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor نامعتبر است")
+    return _appointment_list_response(page["items"], page)
+
+
+@router.get("/export/{clinic_id}")
+def export_appointments(
+    clinic_id: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    format: ExportFormat = "ndjson",
+):
+    """
+    Streams a clinic's appointments by date as NDJSON or CSV, optionally
+    only those from ``start`` up to and including ``end``.
+    """
+    start_at = datetime.combine(start, time.min) if start else None
+    end_at = datetime.combine(end + timedelta(days=1), time.min) if end else None
+    return export_response(
+        lambda db, after, chunk_size: AppointmentService(db).get_appointments_chunk(
+            clinic_id, _EXPORT_COLUMNS, start_at, end_at, after, chunk_size
+        ),
+        _EXPORT_COLUMNS,
+        format,
+        f"appointments-{date.today().isoformat()}",
+    )
 
 
 @router.get("/{appointment_id}", response_model=AppointmentResponse)
 def get_appointment(
     appointment_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     service = AppointmentService(db)
     apt = service.get_appointment(appointment_id)
@@ -114,3 +249,63 @@ def cancel_appointment(
     if not apt:
         raise HTTPException(status_code=404, detail="نوبت یافت نشد")
     return AppointmentResponse.from_orm_with_patient(apt)
+
+
+@async_router.get(
+    "/date/{clinic_id}/{target_date}", response_model=List[AppointmentResponse]
+)
+async def get_appointments_by_date_async(
+    clinic_id: str,
+    target_date: date,
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    headers = cache_headers(
+        await db.run_sync(get_change_version, DAY_LIST_TABLES, clinic_id)
+    )
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
+    service = AsyncAppointmentService(db)
+    response = _appointment_list_response(
+        await service.get_appointments_by_date(
+            clinic_id, target_date, columns=_APPOINTMENT_COLUMNS
+        )
+    )
+    response.headers.update(headers)
+    return response
+
+
+@async_router.get("/upcoming/{clinic_id}", response_model=List[AppointmentResponse])
+async def get_upcoming_appointments_async(
+    clinic_id: str, days: int = 7, db: AsyncSession = Depends(get_async_read_db)
+):
+    service = AsyncAppointmentService(db)
+    return _appointment_list_response(
+        await service.get_upcoming_appointments(
+            clinic_id, days, columns=_APPOINTMENT_COLUMNS
+        )
+    )
+
+
+@async_router.get("/patient/{patient_id}", response_model=List[AppointmentResponse])
+async def get_patient_appointments_async(
+    patient_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    service = AsyncAppointmentService(db)
+    try:
+        page = await service.get_patient_appointments_page(
+            patient_id,
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total,
+            columns=_APPOINTMENT_COLUMNS,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor نامعتبر است")
+    return _appointment_list_response(page["items"], page)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
@@ -6,7 +6,9 @@ from typing import Optional
 from app.database.local_db import local_db
 from app.services.clinic_service import ClinicService
 from app.database.models import Clinic
-from app.api.dependencies import get_db
+from app.api.dependencies import get_db, get_read_db
+from app.api.caching import cache_headers, not_modified
+from app.database.change_versions import get_change_version
 
 router = APIRouter()
 
@@ -24,7 +26,15 @@ class ClinicResponse(BaseModel):
 
 
 @router.get("/default", response_model=ClinicResponse)
-def get_default_clinic(db: Session = Depends(get_db)):
+def get_default_clinic(
+    request: Request, response: Response, db: Session = Depends(get_db)
+):
+    headers = cache_headers(get_change_version(db, [Clinic.__tablename__]))
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    response.headers.update(headers)
+
     service = ClinicService(db)
     clinic = service.ensure_default_clinic()
     return clinic
@@ -33,8 +43,18 @@ def get_default_clinic(db: Session = Depends(get_db)):
 @router.get("/{clinic_id}", response_model=ClinicResponse)
 def get_clinic(
     clinic_id: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
 ):
+    headers = cache_headers(
+        get_change_version(db, [Clinic.__tablename__], clinic_id)
+    )
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    response.headers.update(headers)
+
     service = ClinicService(db)
     clinic = service.get_clinic(clinic_id)
     if not clinic:
@@ -1,7 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
 
+from app.api.caching import not_modified, static_cache_headers
+
 router = APIRouter()
 
 
@@ -27,11 +29,18 @@ class MenuItemResponse(BaseModel):
 
 
 @router.get("/menu", response_model=List[MenuItemResponse])
-def get_navigation_menu():
+def get_navigation_menu(request: Request, response: Response):
     """
     Returns the navigation menu structure for the sidebar.
     This endpoint provides all menu items with their labels, icons, and routes.
+    The menu only changes with the app version, so clients may cache it.
     """
+    headers = static_cache_headers("navigation-menu")
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    response.headers.update(headers)
+
     menu_items = [
         MenuItemResponse(
             id="get-started",
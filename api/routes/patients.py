@@ -1,15 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    UploadFile,
+    status,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from datetime import date
-from typing import List, Optional
+from typing import Any, Dict, Iterator, List, Literal, Optional, Tuple
+import csv
+import io
+import json
 
 from app.database.local_db import local_db
-from app.services.patient_service import PatientService
+from app.services.patient_service import AsyncPatientService, PatientService
 from app.database.models import Patient
-from app.api.dependencies import get_db
+from app.api.dependencies import get_async_read_db, get_db, get_read_db
+from app.api.exports import ExportFormat, export_response
+from app.api.pagination import set_page_headers
+from app.api.responses import FastJSONResponse
 
 router = APIRouter()
+async_router = APIRouter()
 
 
 class PatientCreate(BaseModel):
@@ -59,34 +74,145 @@ class PatientResponse(BaseModel):
         from_attributes = True
 
 
+# PatientResponse's columns, selected directly for lean list responses
+_PATIENT_COLUMNS = [getattr(Patient, name) for name in PatientResponse.model_fields]
+
+
+def _patient_list_response(rows, page: Optional[Dict] = None) -> FastJSONResponse:
+    response = FastJSONResponse([row._asdict() for row in rows])
+    if page is not None:
+        set_page_headers(response, page)
+    return response
+
+
+class PatientImportIssue(BaseModel):
+    row: Optional[int] = None
+    national_id: Optional[str] = None
+    detail: str
+
+
+class PatientImportReport(BaseModel):
+    imported: int
+    conflicts: List[PatientImportIssue]
+    errors: List[PatientImportIssue]
+
+
+def _read_import_rows(
+    upload: UploadFile, fmt: str
+) -> Iterator[Tuple[int, Any]]:
+    """Yield (row_number, raw_fields) from a CSV or NDJSON upload, streaming."""
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        # Row 1 is the header line
+        for row_number, raw in enumerate(csv.DictReader(text), start=2):
+            yield row_number, {
+                key.strip(): (value.strip() or None) if value is not None else None
+                for key, value in raw.items()
+                if key
+            }
+    else:
+        for row_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield row_number, json.loads(line)
+            except ValueError:
+                yield row_number, None
+
+
+def _validated_import_rows(
+    upload: UploadFile, fmt: str, errors: List[Dict[str, Any]]
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    for row_number, raw in _read_import_rows(upload, fmt):
+        if not isinstance(raw, dict):
+            errors.append(
+                {"row": row_number, "national_id": None, "detail": "سطر نامعتبر است"}
+            )
+            continue
+        try:
+            yield row_number, PatientCreate.model_validate(raw).model_dump()
+        except ValidationError as e:
+            errors.append(
+                {
+                    "row": row_number,
+                    "national_id": raw.get("national_id"),
+                    "detail": "; ".join(
+                        f"{'.'.join(map(str, err['loc']))}: {err['msg']}"
+                        for err in e.errors()
+                    ),
+                }
+            )
+
+
 @router.get("/", response_model=List[PatientResponse])
 def list_patients(
     clinic_id: str,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
 ):
+    """
+    Patients ordered by last name, first name. Pass the X-Next-Cursor
+    response header back as ``cursor`` to get the next page; X-Total-Count
+    is only sent when ``include_total=true``. ``skip`` is kept for older
+    clients and pages with OFFSET.
+    """
     service = PatientService(db)
-    return service.get_patients(clinic_id, skip=skip, limit=limit)
+    if skip and not cursor:
+        return _patient_list_response(
+            service.get_patients(
+                clinic_id, skip=skip, limit=limit, columns=_PATIENT_COLUMNS
+            )
+        )
+    try:
+        page = service.get_patients_page(
+            clinic_id,
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total,
+            columns=_PATIENT_COLUMNS,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor نامعتبر است")
+    return _patient_list_response(page["items"], page)
 
 
 @router.get("/search", response_model=List[PatientResponse])
 def search_patients(
     clinic_id: str,
     q: str,
-    db: Session = Depends(get_db),
+    limit: int = 50,
+    db: Session = Depends(get_read_db),
 ):
     if not q or len(q.strip()) == 0:
         service = PatientService(db)
-        return service.get_patients(clinic_id, limit=50)
+        return service.get_patients(clinic_id, limit=limit)
     service = PatientService(db)
-    return service.search_patients(clinic_id, q.strip())
+    return service.search_patients(clinic_id, q.strip(), limit=limit)
+
+
+@router.get("/export")
+def export_patients(clinic_id: str, format: ExportFormat = "ndjson"):
+    """
+    Streams all of a clinic's patients in list order, as NDJSON or as CSV
+    with a header row. The CSV can be imported again through /bulk.
+    """
+    return export_response(
+        lambda db, after, chunk_size: PatientService(db).get_patients_chunk(
+            clinic_id, _PATIENT_COLUMNS, after, chunk_size
+        ),
+        _PATIENT_COLUMNS,
+        format,
+        f"patients-{date.today().isoformat()}",
+    )
 
 
 @router.get("/{patient_id}", response_model=PatientResponse)
 def get_patient(
     patient_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     service = PatientService(db)
     patient = service.get_patient(patient_id)
@@ -126,6 +252,33 @@ def create_patient(
         raise
 
 
+@router.post("/bulk", response_model=PatientImportReport)
+def bulk_import_patients(
+    clinic_id: str,
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Imports patients from a CSV (with header row) or NDJSON file.
+    Rows are validated like POST /api/patients; invalid rows and duplicate
+    national IDs are reported per row without aborting the import.
+    """
+    fmt = format
+    if fmt is None:
+        filename = (file.filename or "").lower()
+        is_csv = filename.endswith(".csv") or file.content_type == "text/csv"
+        fmt = "csv" if is_csv else "ndjson"
+
+    errors: List[Dict[str, Any]] = []
+    service = PatientService(db)
+    report = service.import_patients(
+        clinic_id, _validated_import_rows(file, fmt, errors)
+    )
+    report["errors"] = errors + report["errors"]
+    return report
+
+
 @router.patch("/{patient_id}", response_model=PatientResponse)
 def update_patient(
     patient_id: str,
@@ -151,3 +304,45 @@ def delete_patient(
     if not service.delete_patient(patient_id):
         raise HTTPException(status_code=404, detail="بیمار یافت نشد")
     return None
+
+
+@async_router.get("/", response_model=List[PatientResponse])
+async def list_patients_async(
+    clinic_id: str,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    service = AsyncPatientService(db)
+    if skip and not cursor:
+        return _patient_list_response(
+            await service.get_patients(
+                clinic_id, skip=skip, limit=limit, columns=_PATIENT_COLUMNS
+            )
+        )
+    try:
+        page = await service.get_patients_page(
+            clinic_id,
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total,
+            columns=_PATIENT_COLUMNS,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor نامعتبر است")
+    return _patient_list_response(page["items"], page)
+
+
+@async_router.get("/search", response_model=List[PatientResponse])
+async def search_patients_async(
+    clinic_id: str,
+    q: str,
+    limit: int = 50,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    service = AsyncPatientService(db)
+    if not q or len(q.strip()) == 0:
+        return await service.get_patients(clinic_id, limit=limit)
+    return await service.search_patients(clinic_id, q.strip(), limit=limit)
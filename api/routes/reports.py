@@ -1,20 +1,38 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import date
 from typing import Optional
 
 from app.database.local_db import local_db
-from app.services.report_service import ReportService
-from app.api.dependencies import get_db
+from app.services.report_service import AsyncReportService, ReportService
+from app.api.dependencies import get_async_read_db, get_read_db
+from app.api.exports import ExportFormat, export_response
+from app.api.caching import cache_headers, not_modified
+from app.database.change_versions import get_change_version
+from app.database.models import Appointment, Patient
 
 router = APIRouter()
+async_router = APIRouter()
+
+# Tables the clinic stats are computed from
+STATS_TABLES = [Patient.__tablename__, Appointment.__tablename__]
+
+# Fields of a visit history entry
+VISIT_COLUMNS = (
+    Appointment.id,
+    Appointment.appointment_date.label("date"),
+    Appointment.status,
+    Appointment.visit_fee.label("fee"),
+    Appointment.paid_amount.label("paid"),
+)
 
 
 @router.get("/daily")
 def get_daily_revenue(
     clinic_id: str,
     target_date: Optional[date] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     if not target_date:
         target_date = date.today()
@@ -27,7 +45,7 @@ def get_monthly_revenue(
     clinic_id: str,
     year: Optional[int] = None,
     month: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     service = ReportService(db)
     return service.get_monthly_revenue(clinic_id, year=year, month=month)
@@ -36,16 +54,90 @@ def get_monthly_revenue(
 @router.get("/stats")
 def get_clinic_stats(
     clinic_id: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
 ):
+    # "Today" figures change at midnight without any write
+    change_version = get_change_version(db, STATS_TABLES, clinic_id)
+    headers = cache_headers(change_version, date.today())
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    response.headers.update(headers)
+
     service = ReportService(db)
-    return service.get_clinic_stats(clinic_id)
+    # The body must match the ETag even if another process wrote meanwhile
+    return service.get_clinic_stats(clinic_id, version=change_version[0])
 
 
 @router.get("/patient/{patient_id}/history")
 def get_patient_visit_history(
     patient_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     service = ReportService(db)
     return service.get_patient_visit_history(patient_id)
+
+
+@router.get("/patient/{patient_id}/history/export")
+def export_patient_visit_history(patient_id: str, format: ExportFormat = "ndjson"):
+    """Streams a patient's visits, newest first, as NDJSON or CSV."""
+    return export_response(
+        lambda db, after, chunk_size: ReportService(db).get_patient_visits_chunk(
+            patient_id, VISIT_COLUMNS, after, chunk_size
+        ),
+        VISIT_COLUMNS,
+        format,
+        f"visits-{patient_id}",
+    )
+
+
+@async_router.get("/daily")
+async def get_daily_revenue_async(
+    clinic_id: str,
+    target_date: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    if not target_date:
+        target_date = date.today()
+    service = AsyncReportService(db)
+    return await service.get_daily_revenue(clinic_id, target_date)
+
+
+@async_router.get("/monthly")
+async def get_monthly_revenue_async(
+    clinic_id: str,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    service = AsyncReportService(db)
+    return await service.get_monthly_revenue(clinic_id, year=year, month=month)
+
+
+@async_router.get("/stats")
+async def get_clinic_stats_async(
+    clinic_id: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    change_version = await db.run_sync(get_change_version, STATS_TABLES, clinic_id)
+    headers = cache_headers(change_version, date.today())
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    response.headers.update(headers)
+
+    service = AsyncReportService(db)
+    return await service.get_clinic_stats(clinic_id, version=change_version[0])
+
+
+@async_router.get("/patient/{patient_id}/history")
+async def get_patient_visit_history_async(
+    patient_id: str,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    service = AsyncReportService(db)
+    return await service.get_patient_visit_history(patient_id)
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List, Optional
 import logging
 
 from app.database.sync import sync_engine
+from app.database.sync_scheduler import sync_scheduler
+from app.services.sync_log_service import SyncLogService
+from app.api.dependencies import get_read_db
+from app.api.pagination import set_page_headers
 
 logger = logging.getLogger(__name__)
 
@@ -16,10 +22,26 @@ class SyncResponse(BaseModel):
     result: Dict[str, bool]
 
 
+class SyncLogResponse(BaseModel):
+    id: int
+    sync_id: Optional[str] = None
+    entity_type: str
+    entity_id: str
+    operation: str
+    sync_direction: str
+    status: str
+    error_message: Optional[str] = None
+    item_count: int = 1
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 @router.post("/manual", response_model=SyncResponse)
 async def manual_sync():
     try:
-        result = await sync_engine.perform_sync()
+        result = await sync_scheduler.sync_now()
         return {
             "success": True,
             "message": "Synchronization completed successfully",
@@ -37,6 +59,46 @@ async def manual_sync():
 async def sync_status():
     return {
         "enabled": sync_engine.sync_enabled,
-        "running": sync_engine.running,
+        "running": sync_scheduler.running,
         "interval_seconds": sync_engine.sync_interval,
+        **sync_scheduler.status(),
     }
+
+
+@router.get("/log", response_model=List[SyncLogResponse])
+def sync_log(
+    response: Response,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    status: Optional[str] = None,
+    sync_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    """
+    Sync log rows, newest first. Older successful rows are compacted into
+    one summary per sync run and table (entity_id "*", item_count entities).
+    Pass the X-Next-Cursor response header back as ``cursor`` for the next
+    page.
+    """
+    service = SyncLogService(db)
+    try:
+        page = service.get_logs_page(
+            entity_type=entity_type,
+            entity_id=entity_id,
+            status=status,
+            sync_id=sync_id,
+            since=since,
+            until=until,
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor نامعتبر است")
+    set_page_headers(response, page)
+    return page["items"]
@@ -18,7 +18,9 @@ a = Analysis(
         'PySide6.QtCore',
         'PySide6.QtGui',
         'PySide6.QtWidgets',
-        'supabase',
+        'httpx',
+        'aiosqlite',
+        'sqlalchemy.dialects.sqlite.aiosqlite',
         'passlib.handlers.bcrypt',
     ],
     hookspath=[],
@@ -24,20 +24,72 @@ class Settings(BaseSettings):
 
     # Local Database
     local_db_path: str = str(DATA_DIR / "clinic.db")
+    # Read-only connections used alongside the single writer connection.
+    # 0 = legacy mode: one shared connection for everything.
+    db_read_pool_size: int = 4
+    # Serve the API's list and report endpoints as async handlers on an
+    # aiosqlite engine instead of the thread pool (needs aiosqlite)
+    async_db_enabled: bool = False
+
+    # SQLite performance profile, applied to every new connection.
+    # synchronous=NORMAL is durable against app crashes in WAL mode and only
+    # fsyncs at checkpoints; use FULL for power-loss durability per commit.
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    sqlite_cache_size_kb: int = 16384
+    sqlite_mmap_size: int = 134217728  # bytes, 0 disables memory-mapped I/O
+    sqlite_temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_wal_autocheckpoint: int = 1000  # pages
+    # Periodic PRAGMA optimize + WAL checkpoint, 0 disables
+    sqlite_maintenance_interval_minutes: int = 60
 
     # Supabase (Online Mode)
     supabase_url: str = ""
     supabase_anon_key: str = ""
     supabase_service_key: str = ""
+    # Remote REST client: parallel requests, timeouts and retries
+    remote_max_concurrency: int = 4
+    remote_timeout_seconds: float = 30.0
+    remote_connect_timeout_seconds: float = 10.0
+    remote_max_retries: int = 3
+    remote_retry_backoff_seconds: float = 0.5  # doubled on every retry
 
     # Security
     secret_key: str = "change-this-secret-key-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 1440
 
+    # Rows fetched and sent at a time by the streaming export endpoints
+    export_chunk_size: int = 1000
+    # gzip responses of at least this many bytes for clients that accept
+    # it, 0 disables compression
+    gzip_minimum_size: int = 1024
+
+    # Reports: seconds to cache /api/reports/stats per clinic, 0 disables
+    report_stats_cache_seconds: int = 30
+
     # Sync Settings
     sync_interval_minutes: int = 5
     auto_sync_enabled: bool = True
+    # Background scheduler: sync this long after the last local change,
+    # and back off exponentially up to sync_max_backoff_minutes while the
+    # remote is unreachable
+    sync_debounce_seconds: float = 5.0
+    sync_max_backoff_minutes: int = 30
+    # Rows per bulk upsert request when uploading pending changes
+    sync_batch_size: int = 500
+    # Rows per page when downloading remote changes
+    sync_page_size: int = 1000
+    # Downloads restart this far behind the last server updated_at seen,
+    # for rows whose writing transaction committed after that download
+    sync_download_overlap_seconds: int = 30
+    # Sync log housekeeping after every sync: successful per-entity rows
+    # older than sync_log_detail_days are folded into per-sync summaries,
+    # rows older than sync_log_retention_days or beyond sync_log_max_rows
+    # (oldest first) are deleted. 0 disables the respective step.
+    sync_log_detail_days: int = 7
+    sync_log_retention_days: int = 90
+    sync_log_max_rows: int = 200000
 
     # SMS Settings
     sms_enabled: bool = False
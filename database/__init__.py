@@ -1,4 +1,14 @@
-from .models import Base, Clinic, Patient, Appointment, SyncLog
+from .models import (
+    Base,
+    Clinic,
+    Patient,
+    Appointment,
+    DailyRevenueRollup,
+    SyncLog,
+    SyncState,
+    SyncOutbox,
+    ChangeVersion,
+)
 from .local_db import LocalDatabase
 from .remote_db import RemoteDatabase
 
@@ -7,7 +17,11 @@ __all__ = [
     "Clinic",
     "Patient",
     "Appointment",
+    "DailyRevenueRollup",
     "SyncLog",
+    "SyncState",
+    "SyncOutbox",
+    "ChangeVersion",
     "LocalDatabase",
     "RemoteDatabase",
 ]
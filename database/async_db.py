@@ -0,0 +1,76 @@
+"""Async read-only engine for the API server (``async_db_enabled``).
+
+The API's list and report endpoints can run as ``async def`` handlers on
+an aiosqlite AsyncEngine instead of blocking sessions in Starlette's
+thread pool. The engine only reads: schema, migrations and every write
+stay on LocalDatabase's writer connection, and its connections use the
+same pragmas (WAL, query_only) as the synchronous read pool.
+
+Services keep one implementation of their queries: the Async*Service
+classes run them with AsyncSession.run_sync.
+"""
+
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import settings
+from .local_db import apply_sqlite_pragmas, local_db
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLocalDatabase:
+    def __init__(self, db_path: str = None, pool_size: int = None):
+        self.db_path = db_path or local_db.db_path
+        self.pool_size = max(
+            1, settings.db_read_pool_size if pool_size is None else pool_size
+        )
+        self.engine: Optional[AsyncEngine] = None
+        self.SessionLocal: Optional[async_sessionmaker] = None
+
+    def _initialize(self):
+        self.engine = create_async_engine(
+            f"sqlite+aiosqlite:///{self.db_path}",
+            echo=False,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=self.pool_size,
+            max_overflow=0,
+        )
+
+        @event.listens_for(self.engine.sync_engine, "connect")
+        def set_sqlite_pragma(dbapi_conn, connection_record):
+            apply_sqlite_pragmas(dbapi_conn, read_only=True)
+
+        self.SessionLocal = async_sessionmaker(
+            self.engine, autoflush=False, expire_on_commit=False
+        )
+        logger.info(
+            f"Async read engine initialized at: {self.db_path} "
+            f"(connections: {self.pool_size})"
+        )
+
+    @asynccontextmanager
+    async def get_session(self) -> AsyncIterator[AsyncSession]:
+        if self.engine is None:
+            self._initialize()
+        async with self.SessionLocal() as session:
+            yield session
+
+    async def close(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+            logger.info("Async read engine closed")
+
+
+async_local_db = AsyncLocalDatabase()
@@ -0,0 +1,96 @@
+"""Per clinic change versions of the clinic data tables.
+
+AFTER INSERT/UPDATE/DELETE triggers (like the outbox's, so services,
+sync, bulk import and SMS reminders are all covered) bump
+change_versions.version for the row's clinic and table and stamp
+updated_at. Updates only count when a data column changed, not for the
+sync bookkeeping written after an upload. Readers compare versions instead of re-running their
+queries: one primary key lookup tells whether anything a response
+depends on has changed.
+"""
+
+import logging
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .models import Appointment, ChangeVersion, Clinic, Patient
+from .outbox import tracked_columns
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_TABLE = ChangeVersion.__tablename__
+
+# Table -> column holding the row's clinic
+_CLINIC_COLUMNS = {
+    Clinic.__tablename__: "id",
+    Patient.__tablename__: "clinic_id",
+    Appointment.__tablename__: "clinic_id",
+}
+
+_MODELS = {model.__tablename__: model for model in (Clinic, Patient, Appointment)}
+
+
+def _trigger_name(table_name: str, event: str) -> str:
+    return f"{table_name}_version_{event}"
+
+
+def _create_trigger(table_name: str, event: str) -> str:
+    row = "old" if event == "delete" else "new"
+    when = ""
+    if event == "update":
+        changed = " OR ".join(
+            f"old.{name} IS NOT new.{name}"
+            for name in tracked_columns(_MODELS[table_name])
+        )
+        when = f"WHEN {changed} "
+    return (
+        f"CREATE TRIGGER {_trigger_name(table_name, event)} "
+        f"AFTER {event.upper()} ON {table_name} {when}BEGIN "
+        f"INSERT INTO {VERSIONS_TABLE} (clinic_id, table_name, version, updated_at) "
+        f"VALUES ({row}.{_CLINIC_COLUMNS[table_name]}, '{table_name}', 1, "
+        f"datetime('now')) "
+        f"ON CONFLICT (clinic_id, table_name) DO UPDATE SET "
+        f"version = version + 1, updated_at = excluded.updated_at; "
+        f"END"
+    )
+
+
+def ensure_change_versions(conn) -> None:
+    """Create or update the version triggers."""
+    existing = dict(
+        conn.exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+        ).all()
+    )
+    for table_name in _CLINIC_COLUMNS:
+        for event in ("insert", "update", "delete"):
+            name = _trigger_name(table_name, event)
+            statement = _create_trigger(table_name, event)
+            if existing.get(name) == statement:
+                continue
+            if name in existing:
+                conn.exec_driver_sql(f"DROP TRIGGER {name}")
+            conn.exec_driver_sql(statement)
+            logger.info(f"Created change version trigger {name}")
+
+
+def get_change_version(
+    session: Session, tables: Iterable[str], clinic_id: Optional[str] = None
+) -> Tuple[int, Optional[datetime]]:
+    """Combined version and last change time of ``tables`` for one clinic,
+    or for all clinics when ``clinic_id`` is None.
+
+    Versions only grow, so their sum changes whenever any of them does.
+    Tables never written since the triggers were created count as 0.
+    """
+    query = session.query(
+        func.coalesce(func.sum(ChangeVersion.version), 0),
+        func.max(ChangeVersion.updated_at),
+    ).filter(ChangeVersion.table_name.in_(list(tables)))
+    if clinic_id is not None:
+        query = query.filter(ChangeVersion.clinic_id == clinic_id)
+    version, updated_at = query.one()
+    return version, updated_at
@@ -1,48 +1,163 @@
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import QueuePool, StaticPool
 from contextlib import contextmanager
-from typing import Generator
+from typing import Generator, Optional
 import logging
+import threading
 
 from app.config import settings
 from .models import Base
+from .patient_search import backfill_patient_search_keys, ensure_patient_fts
+from .change_versions import ensure_change_versions
+from .outbox import ensure_outbox
+from .rollup import ensure_rollup
+from .sync_state import seed_sync_state
 
 logger = logging.getLogger(__name__)
 
 
+def apply_sqlite_pragmas(dbapi_conn, read_only: bool) -> None:
+    """Per-connection settings shared by every engine on the database file."""
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    # Negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kb)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    cursor.execute(f"PRAGMA temp_store={settings.sqlite_temp_store}")
+    cursor.execute(
+        f"PRAGMA wal_autocheckpoint={int(settings.sqlite_wal_autocheckpoint)}"
+    )
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
 class LocalDatabase:
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, read_pool_size: int = None):
         self.db_path = db_path or settings.local_db_path
+        self.read_pool_size = (
+            settings.db_read_pool_size if read_pool_size is None else read_pool_size
+        )
         self.engine = None
+        self.read_engine = None
         self.SessionLocal = None
+        self.ReadSessionLocal = None
+        self._maintenance_thread: Optional[threading.Thread] = None
+        self._maintenance_stop = threading.Event()
         self._initialize()
 
     def _initialize(self):
-        self.engine = create_engine(
+        pooled = self.read_pool_size > 0 and self.db_path != ":memory:"
+
+        if pooled:
+            # One dedicated writer connection: SQLite allows a single writer
+            # at a time, so writers queue here instead of hitting SQLITE_BUSY.
+            self.engine = self._create_engine(
+                read_only=False,
+                poolclass=QueuePool,
+                pool_size=1,
+                max_overflow=0,
+            )
+        else:
+            self.engine = self._create_engine(read_only=False, poolclass=StaticPool)
+
+        self.SessionLocal = sessionmaker(
+            autocommit=False, autoflush=False, bind=self.engine
+        )
+
+        Base.metadata.create_all(bind=self.engine)
+        self._migrate()
+
+        if pooled:
+            # WAL lets readers run concurrently with each other and with the
+            # writer, each on its own connection.
+            self.read_engine = self._create_engine(
+                read_only=True,
+                poolclass=QueuePool,
+                pool_size=self.read_pool_size,
+                max_overflow=0,
+            )
+        else:
+            self.read_engine = self.engine
+
+        self.ReadSessionLocal = sessionmaker(
+            autocommit=False, autoflush=False, bind=self.read_engine
+        )
+
+        logger.info(
+            f"Local database initialized at: {self.db_path} "
+            f"(read connections: {self.read_pool_size if pooled else 'shared'})"
+        )
+
+    def _create_engine(self, read_only: bool, **pool_kwargs):
+        engine = create_engine(
             f"sqlite:///{self.db_path}",
             connect_args={"check_same_thread": False},
-            poolclass=StaticPool,
             echo=False,
+            **pool_kwargs,
         )
 
-        @event.listens_for(self.engine, "connect")
+        @event.listens_for(engine, "connect")
         def set_sqlite_pragma(dbapi_conn, connection_record):
-            cursor = dbapi_conn.cursor()
-            cursor.execute("PRAGMA foreign_keys=ON")
-            cursor.execute("PRAGMA journal_mode=WAL")
-            cursor.close()
+            apply_sqlite_pragmas(dbapi_conn, read_only)
 
-        self.SessionLocal = sessionmaker(
-            autocommit=False, autoflush=False, bind=self.engine
-        )
+        return engine
 
-        Base.metadata.create_all(bind=self.engine)
-        logger.info(f"Local database initialized at: {self.db_path}")
+    def _migrate(self):
+        """Bring an existing database file up to the current schema.
+
+        create_all() only creates missing tables, so columns and indexes
+        added to models after a clinic's database was first created are
+        created here. Every step is idempotent and safe to run on each startup.
+        """
+        with self.engine.begin() as conn:
+            self._add_missing_columns(conn)
+            self._create_missing_indexes(conn)
+            backfill_patient_search_keys(conn)
+            ensure_patient_fts(conn)
+            ensure_rollup(conn)
+            seed_sync_state(conn)
+            ensure_outbox(conn)
+            ensure_change_versions(conn)
+
+    def _add_missing_columns(self, conn):
+        for table in Base.metadata.sorted_tables:
+            existing = {
+                row[1]
+                for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')
+            }
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                col_spec = col.type.compile(dialect=conn.dialect)
+                if col.server_default is not None:
+                    # Existing rows take the default; only then can SQLite
+                    # add a NOT NULL column
+                    default = col.server_default.arg
+                    default = getattr(default, "text", f"'{default}'")
+                    col_spec += f" DEFAULT {default}"
+                    if not col.nullable:
+                        col_spec += " NOT NULL"
+                conn.exec_driver_sql(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" {col_spec}'
+                )
+                logger.info(f"Added column {table.name}.{col.name}")
+
+    def _create_missing_indexes(self, conn):
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+    def _session_factory(self, readonly: bool) -> sessionmaker:
+        return self.ReadSessionLocal if readonly else self.SessionLocal
 
     @contextmanager
-    def get_session(self) -> Generator[Session, None, None]:
-        session = self.SessionLocal()
+    def get_session(self, readonly: bool = False) -> Generator[Session, None, None]:
+        session = self._session_factory(readonly)()
         try:
             yield session
             session.commit()
@@ -53,14 +168,61 @@ class LocalDatabase:
         finally:
             session.close()
 
-    def get_db(self) -> Generator[Session, None, None]:
-        session = self.SessionLocal()
+    def get_db(self, readonly: bool = False) -> Generator[Session, None, None]:
+        session = self._session_factory(readonly)()
         try:
             yield session
         finally:
             session.close()
 
+    def run_maintenance(self):
+        """Refresh planner statistics and fold the WAL back into the database."""
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+            busy, wal_pages, checkpointed = conn.exec_driver_sql(
+                "PRAGMA wal_checkpoint(PASSIVE)"
+            ).one()
+        logger.debug(
+            f"SQLite maintenance done (wal pages: {wal_pages}, "
+            f"checkpointed: {checkpointed}, busy: {busy})"
+        )
+
+    def start_maintenance(self, interval_minutes: int = None):
+        interval = (
+            settings.sqlite_maintenance_interval_minutes
+            if interval_minutes is None
+            else interval_minutes
+        )
+        if interval <= 0 or self.db_path == ":memory:":
+            return
+        if self._maintenance_thread and self._maintenance_thread.is_alive():
+            return
+
+        self._maintenance_stop.clear()
+
+        def loop():
+            while not self._maintenance_stop.wait(interval * 60):
+                try:
+                    self.run_maintenance()
+                except Exception as e:
+                    logger.warning(f"SQLite maintenance failed: {e}")
+
+        self._maintenance_thread = threading.Thread(
+            target=loop, name="sqlite-maintenance", daemon=True
+        )
+        self._maintenance_thread.start()
+        logger.info(f"SQLite maintenance scheduled every {interval} minutes")
+
+    def stop_maintenance(self):
+        self._maintenance_stop.set()
+        if self._maintenance_thread:
+            self._maintenance_thread.join(timeout=5)
+            self._maintenance_thread = None
+
     def close(self):
+        self.stop_maintenance()
+        if self.read_engine is not None and self.read_engine is not self.engine:
+            self.read_engine.dispose()
         if self.engine:
             self.engine.dispose()
             logger.info("Local database connection closed")
@@ -10,6 +10,8 @@ from sqlalchemy import (
     Text,
     Numeric,
     Date,
+    Index,
+    text,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -62,6 +64,11 @@ class Patient(Base):
     medical_notes = Column(Text)
     allergies = Column(Text)
 
+    # Normalized search keys (see database.patient_search), local only
+    search_first_name = Column(String(100), info={"local_only": True})
+    search_last_name = Column(String(100), info={"local_only": True})
+    search_contact = Column(String(80), info={"local_only": True})
+
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
@@ -72,6 +79,37 @@ class Patient(Base):
     clinic = relationship("Clinic", back_populates="patients")
     appointments = relationship("Appointment", back_populates="patient")
 
+    __table_args__ = (
+        # Active patients of a clinic (list/count/search all filter on this)
+        Index(
+            "ix_patients_clinic_active",
+            "clinic_id",
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        # Stable name-ordered listing / keyset pagination
+        Index(
+            "ix_patients_clinic_name_active",
+            "clinic_id",
+            "last_name",
+            "first_name",
+            "id",
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        # Prefix lookups on normalized names (short search queries)
+        Index(
+            "ix_patients_search_first_name",
+            "clinic_id",
+            "search_first_name",
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_patients_search_last_name",
+            "clinic_id",
+            "search_last_name",
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+    )
+
 
 class Appointment(Base):
     __tablename__ = "appointments"
@@ -108,6 +146,56 @@ class Appointment(Base):
     clinic = relationship("Clinic", back_populates="appointments")
     patient = relationship("Patient", back_populates="appointments")
 
+    __table_args__ = (
+        # Upcoming, reminders and availability: clinic + status + date range
+        Index(
+            "ix_appointments_clinic_status_date_active",
+            "clinic_id",
+            "status",
+            "appointment_date",
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        # Patient history, newest first
+        Index(
+            "ix_appointments_patient_date_active",
+            "patient_id",
+            "appointment_date",
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        # Calendar / daily lists by date range; also covers the revenue
+        # report columns so those never touch the table itself
+        Index(
+            "ix_appointments_revenue",
+            "clinic_id",
+            "appointment_date",
+            "status",
+            "visit_fee",
+            "paid_amount",
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+    )
+
+
+class DailyRevenueRollup(Base):
+    """Per clinic, per day appointment counts and revenue.
+
+    Derived from appointments and kept current by database.rollup; local
+    only, never synced.
+    """
+
+    __tablename__ = "daily_revenue_rollup"
+
+    clinic_id = Column(String, ForeignKey("clinics.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    appointment_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+    cancelled_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(12, 2), nullable=False, default=0)
+    paid = Column(Numeric(12, 2), nullable=False, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 class SyncLog(Base):
     __tablename__ = "sync_logs"
@@ -119,5 +207,77 @@ class SyncLog(Base):
     sync_direction = Column(String(20), nullable=False)
     status = Column(String(20), nullable=False)
     error_message = Column(Text, nullable=True)
+    # Run that wrote the row; summary rows made by compaction (entity_id
+    # "*", see database.sync_log) count several entities in item_count
+    sync_id = Column(String(36), nullable=True)
+    item_count = Column(Integer, nullable=False, default=1, server_default="1")
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # History of one record
+        Index("ix_sync_logs_entity", "entity_type", "entity_id", "created_at"),
+        # Recent failures; also the compaction scan
+        Index("ix_sync_logs_status", "status", "created_at"),
+        # Retention
+        Index("ix_sync_logs_created_at", "created_at"),
+    )
+
+
+class SyncState(Base):
+    """Per table download position, see database.sync_state.
+
+    Server (updated_at, id) of the last downloaded row applied locally,
+    kept verbatim as the server sent them so they compare exactly in the
+    next request's filter.
+    """
+
+    __tablename__ = "sync_state"
+
+    table_name = Column(String(50), primary_key=True)
+    remote_updated_at = Column(String(64), nullable=True)
+    remote_id = Column(String, nullable=True)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SyncOutbox(Base):
+    """Local changes waiting to be uploaded, one row per entity.
+
+    Filled by triggers (see database.outbox); repeated changes to the same
+    entity bump ``version`` and add to ``changed_columns`` instead of adding
+    rows.
+    """
+
+    __tablename__ = "sync_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity_type = Column(String(50), nullable=False)
+    entity_id = Column(String, nullable=False)
+    operation = Column(String(20), nullable=False)  # upsert | delete
+    # ",col,col," changed since the last upload, NULL = send the whole row
+    changed_columns = Column(Text, nullable=True)
+    version = Column(Integer, nullable=False, default=1)
 
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ux_sync_outbox_entity", "entity_type", "entity_id", unique=True),
+    )
+
+
+class ChangeVersion(Base):
+    """Write counter per clinic and table, see database.change_versions.
+
+    Bumped by triggers on every insert, delete and update of data columns;
+    HTTP caching (api.caching) derives ETags from it.
+    """
+
+    __tablename__ = "change_versions"
+
+    clinic_id = Column(String, primary_key=True)
+    table_name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow)
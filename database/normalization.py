@@ -0,0 +1,61 @@
+"""Text normalization for search keys (Persian/Arabic aware).
+
+Receptionists type the same name with Arabic or Persian letter forms, with or
+without ZWNJ and diacritics, and type digits in Persian, Arabic-Indic or
+Latin. Both stored search keys and incoming queries go through
+normalize_search_text() so these variants compare equal.
+"""
+
+import re
+from typing import Optional
+
+_LETTER_MAP = {
+    "ي": "ی",  # ARABIC YEH -> FARSI YEH
+    "ى": "ی",  # ALEF MAKSURA -> FARSI YEH
+    "ئ": "ی",  # YEH WITH HAMZA -> FARSI YEH
+    "ك": "ک",  # ARABIC KAF -> KEHEH
+    "ة": "ه",  # TEH MARBUTA -> HEH
+    "ۀ": "ه",  # HEH WITH YEH ABOVE -> HEH
+    "أ": "ا",  # ALEF WITH HAMZA ABOVE -> ALEF
+    "إ": "ا",  # ALEF WITH HAMZA BELOW -> ALEF
+    "آ": "ا",  # ALEF WITH MADDA -> ALEF
+    "ٱ": "ا",  # ALEF WASLA -> ALEF
+    "ؤ": "و",  # WAW WITH HAMZA -> WAW
+}
+
+# Persian (U+06F0..U+06F9) and Arabic-Indic (U+0660..U+0669) digits
+_DIGIT_MAP = {
+    **{0x06F0 + i: str(i) for i in range(10)},
+    **{0x0660 + i: str(i) for i in range(10)},
+}
+
+_STRIPPED = [chr(c) for c in range(0x064B, 0x0660)] + [  # harakat, shadda, ...
+    "\u0670",  # superscript alef
+    "\u0640",  # tatweel
+    "\u200c",  # ZWNJ
+    "\u200d",  # ZWJ
+    "\u200e",  # LRM
+    "\u200f",  # RLM
+]
+
+_TRANSLATION = str.maketrans(
+    {**_LETTER_MAP, **_DIGIT_MAP, **{ch: None for ch in _STRIPPED}}
+)
+
+_WHITESPACE = re.compile(r"\s+")
+_NON_DIGITS = re.compile(r"\D+")
+
+
+def normalize_search_text(value: Optional[str]) -> str:
+    """Unify letter forms, strip diacritics/ZWNJ, fold digits to ASCII."""
+    if not value:
+        return ""
+    value = value.translate(_TRANSLATION).casefold()
+    return _WHITESPACE.sub(" ", value).strip()
+
+
+def normalize_digits(value: Optional[str]) -> str:
+    """ASCII digits only, for national IDs and phone numbers."""
+    if not value:
+        return ""
+    return _NON_DIGITS.sub("", value.translate(_TRANSLATION))
@@ -0,0 +1,190 @@
+"""Change capture for upload (the sync_outbox table).
+
+Triggers on the synced tables queue every local write (sync_status
+'pending'), coalesced per entity with the changed columns accumulated.
+Upload removes an entry only if its ``version`` is unchanged.
+"""
+
+import logging
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import Row, delete, func, select, tuple_
+from sqlalchemy.orm import Session
+
+from .models import SyncOutbox
+from .sync_state import SYNCED_MODELS
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_TABLE = SyncOutbox.__tablename__
+
+# Never sent in partial payloads: the key is always sent, updated_at is
+# set by the server, the sync bookkeeping is never compared remotely
+UNTRACKED_COLUMNS = {"id", "updated_at", "sync_status", "last_synced_at"}
+
+# Rows edited very often before an upload fall back to a full row instead
+# of growing the accumulated column list without bound
+MAX_CHANGED_COLUMNS_LENGTH = 2000
+
+# Obsolete since upload discovery moved to the outbox
+_OBSOLETE_INDEXES = [
+    f"ix_{model.__tablename__}_{suffix}"
+    for model in SYNCED_MODELS
+    for suffix in ("unsynced", "updated_active")
+]
+
+
+def _trigger_name(table_name: str, event: str) -> str:
+    return f"{table_name}_outbox_{event}"
+
+
+def tracked_columns(model) -> List[str]:
+    """Columns whose changes are recorded for partial uploads."""
+    return [
+        column.name
+        for column in model.__table__.columns
+        if column.name not in UNTRACKED_COLUMNS and not column.info.get("local_only")
+    ]
+
+
+def _changed_columns_expression(model, event: str) -> str:
+    if event == "insert":
+        return "NULL"
+    # ",status,reminder_sent," for the columns this UPDATE changed
+    return "',' || " + " || ".join(
+        f"CASE WHEN old.{name} IS NOT new.{name} THEN '{name},' ELSE '' END"
+        for name in tracked_columns(model)
+    )
+
+
+def _capture_condition(model, event: str) -> str:
+    if event == "insert":
+        return "new.sync_status = 'pending'"
+    # An UPDATE that changed no tracked column has nothing to upload
+    changed = " OR ".join(
+        f"old.{name} IS NOT new.{name}" for name in tracked_columns(model)
+    )
+    return f"new.sync_status = 'pending' AND ({changed})"
+
+
+def _create_trigger(model, event: str) -> str:
+    table_name = model.__tablename__
+    return (
+        f"CREATE TRIGGER {_trigger_name(table_name, event)} "
+        f"AFTER {event.upper()} ON {table_name} "
+        f"WHEN {_capture_condition(model, event)} BEGIN "
+        f"INSERT INTO {OUTBOX_TABLE} "
+        f"(entity_type, entity_id, operation, changed_columns, version, "
+        f"created_at, updated_at) "
+        f"VALUES ('{table_name}', new.id, "
+        f"CASE WHEN new.deleted_at IS NULL THEN 'upsert' ELSE 'delete' END, "
+        f"{_changed_columns_expression(model, event)}, 1, "
+        f"datetime('now'), datetime('now')) "
+        f"ON CONFLICT (entity_type, entity_id) DO UPDATE SET "
+        f"version = version + 1, operation = excluded.operation, "
+        f"changed_columns = CASE WHEN changed_columns IS NULL "
+        f"OR excluded.changed_columns IS NULL "
+        f"OR length(changed_columns) > {MAX_CHANGED_COLUMNS_LENGTH} THEN NULL "
+        f"ELSE changed_columns || excluded.changed_columns END, "
+        f"updated_at = excluded.updated_at; "
+        f"END"
+    )
+
+
+def _seed_statement(table_name: str) -> str:
+    """Queue rows changed before the triggers existed."""
+    return (
+        f"INSERT OR IGNORE INTO {OUTBOX_TABLE} "
+        f"(entity_type, entity_id, operation, version, created_at, updated_at) "
+        f"SELECT '{table_name}', id, "
+        f"CASE WHEN deleted_at IS NULL THEN 'upsert' ELSE 'delete' END, 1, "
+        f"datetime('now'), datetime('now') "
+        f"FROM {table_name} WHERE sync_status != 'synced' "
+        f"OR last_synced_at IS NULL OR last_synced_at < updated_at "
+        f"ORDER BY updated_at"
+    )
+
+
+def ensure_outbox(conn) -> None:
+    """Create or update the capture triggers; the first time, also queue
+    everything that is not synced yet."""
+    existing = dict(
+        conn.exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+        ).all()
+    )
+    for model in SYNCED_MODELS:
+        table_name = model.__tablename__
+        first_time = True
+        for event in ("insert", "update"):
+            name = _trigger_name(table_name, event)
+            statement = _create_trigger(model, event)
+            if name in existing:
+                first_time = False
+                if existing[name] == statement:
+                    continue
+                conn.exec_driver_sql(f"DROP TRIGGER {name}")
+            conn.exec_driver_sql(statement)
+
+        if first_time:
+            queued = conn.exec_driver_sql(_seed_statement(table_name)).rowcount
+            logger.info(f"Sync outbox enabled for {table_name} ({queued} queued)")
+
+    for name in _OBSOLETE_INDEXES:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+
+def changed_columns(entry) -> Optional[Set[str]]:
+    """Columns changed since the last upload, None when the whole row must
+    be sent (new rows, rows queued before change tracking)."""
+    if entry.changed_columns is None:
+        return None
+    return {name for name in entry.changed_columns.split(",") if name}
+
+
+def pending_changes(session: Session, table_name: str) -> List[Row]:
+    """Queued changes of one table, oldest first, as plain rows
+    (entity_id, operation, changed_columns, version) that stay usable after
+    the session is closed."""
+    return session.execute(
+        select(
+            SyncOutbox.entity_id,
+            SyncOutbox.operation,
+            SyncOutbox.changed_columns,
+            SyncOutbox.version,
+        )
+        .where(SyncOutbox.entity_type == table_name)
+        .order_by(SyncOutbox.id)
+    ).all()
+
+
+def acknowledge(session: Session, table_name: str, entries: Iterable[Row]) -> None:
+    """Remove uploaded entries unless they changed again in the meantime."""
+    keys = [(entry.entity_id, entry.version) for entry in entries]
+    if not keys:
+        return
+    session.execute(
+        delete(SyncOutbox)
+        .where(
+            SyncOutbox.entity_type == table_name,
+            tuple_(SyncOutbox.entity_id, SyncOutbox.version).in_(keys),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def queued_ids(session: Session, table_name: str, ids: Iterable[str]) -> Set[str]:
+    """Which of ``ids`` have a local change waiting for upload."""
+    return set(
+        session.execute(
+            select(SyncOutbox.entity_id).where(
+                SyncOutbox.entity_type == table_name,
+                SyncOutbox.entity_id.in_(list(ids)),
+            )
+        ).scalars()
+    )
+
+
+def queue_depth(session: Session) -> int:
+    """Number of entities waiting for upload."""
+    return session.query(func.count(SyncOutbox.id)).scalar()
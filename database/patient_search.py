@@ -0,0 +1,202 @@
+"""Patient search keys and full-text index (SQLite FTS5, trigram tokenizer).
+
+Patients carry normalized search columns (letters unified, diacritics and
+ZWNJ stripped, digits folded to ASCII, see database.normalization) which are
+written by the services on every insert/update and backfilled here for older
+rows. The FTS index is an external-content FTS5 table over those columns,
+kept in sync by triggers, so every write path (services, bulk import, sync)
+maintains it without extra code. When the SQLite build lacks FTS5 or the
+trigram tokenizer, the table is simply not created and searches fall back to
+LIKE on the same normalized columns.
+"""
+
+import logging
+import re
+from typing import Dict, Optional
+
+from sqlalchemy import column, table, text
+from sqlalchemy.orm import Session
+
+from .normalization import normalize_digits, normalize_search_text
+
+logger = logging.getLogger(__name__)
+
+PATIENT_FTS_TABLE = "patients_fts"
+PATIENT_FTS_COLUMNS = ("search_first_name", "search_last_name", "search_contact")
+
+# Trigram tokens are three characters long, shorter terms cannot be matched
+MIN_FTS_TERM_LENGTH = 3
+
+BACKFILL_BATCH_SIZE = 1000
+
+patients_fts = table(PATIENT_FTS_TABLE, column("rowid"), column("rank"))
+
+_availability: Dict[str, bool] = {}
+
+_PHONE_LIKE = re.compile(r"^[\d\s()+-]+$")
+
+
+def patient_search_keys(
+    first_name: Optional[str],
+    last_name: Optional[str],
+    national_id: Optional[str] = None,
+    phone: Optional[str] = None,
+    mobile: Optional[str] = None,
+) -> Dict[str, str]:
+    contact = " ".join(
+        digits
+        for digits in (
+            normalize_digits(national_id),
+            normalize_digits(mobile),
+            normalize_digits(phone),
+        )
+        if digits
+    )
+    return {
+        "search_first_name": normalize_search_text(first_name),
+        "search_last_name": normalize_search_text(last_name),
+        "search_contact": contact,
+    }
+
+
+def apply_patient_search_keys(patient) -> None:
+    """Recompute the search columns of a Patient instance in place."""
+    keys = patient_search_keys(
+        patient.first_name,
+        patient.last_name,
+        patient.national_id,
+        patient.phone,
+        patient.mobile,
+    )
+    for key, value in keys.items():
+        setattr(patient, key, value)
+
+
+def normalize_search_query(query: str) -> str:
+    """Normalize a search box query the same way stored keys are normalized."""
+    normalized = normalize_search_text(query)
+    if _PHONE_LIKE.match(normalized):
+        # "0912 123-45-67" should match the digits-only contact key
+        return normalize_digits(normalized)
+    return normalized
+
+
+def backfill_patient_search_keys(conn) -> int:
+    """Fill search columns for rows written before they existed."""
+    total = 0
+    while True:
+        rows = conn.execute(
+            text(
+                "SELECT id, first_name, last_name, national_id, phone, mobile "
+                "FROM patients WHERE search_first_name IS NULL LIMIT :limit"
+            ),
+            {"limit": BACKFILL_BATCH_SIZE},
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            text(
+                "UPDATE patients SET search_first_name = :search_first_name, "
+                "search_last_name = :search_last_name, "
+                "search_contact = :search_contact WHERE id = :id"
+            ),
+            [
+                {"id": row.id, **patient_search_keys(*row[1:])}
+                for row in rows
+            ],
+        )
+        total += len(rows)
+
+    if total:
+        logger.info(f"Backfilled search keys for {total} patients")
+    return total
+
+
+def _create_statements():
+    cols = ", ".join(PATIENT_FTS_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in PATIENT_FTS_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in PATIENT_FTS_COLUMNS)
+    delete_old = (
+        f"INSERT INTO {PATIENT_FTS_TABLE}({PATIENT_FTS_TABLE}, rowid, {cols}) "
+        f"VALUES ('delete', old.rowid, {old_values});"
+    )
+    insert_new = (
+        f"INSERT INTO {PATIENT_FTS_TABLE}(rowid, {cols}) "
+        f"VALUES (new.rowid, {new_values});"
+    )
+    return [
+        f"CREATE VIRTUAL TABLE {PATIENT_FTS_TABLE} USING fts5("
+        f"{cols}, content='patients', content_rowid='rowid', tokenize='trigram')",
+        f"CREATE TRIGGER {PATIENT_FTS_TABLE}_ai AFTER INSERT ON patients "
+        f"BEGIN {insert_new} END",
+        f"CREATE TRIGGER {PATIENT_FTS_TABLE}_ad AFTER DELETE ON patients "
+        f"BEGIN {delete_old} END",
+        f"CREATE TRIGGER {PATIENT_FTS_TABLE}_au AFTER UPDATE OF {cols} ON patients "
+        f"BEGIN {delete_old} {insert_new} END",
+        f"INSERT INTO {PATIENT_FTS_TABLE}({PATIENT_FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+
+def _drop_statements():
+    return [
+        f"DROP TRIGGER IF EXISTS {PATIENT_FTS_TABLE}_ai",
+        f"DROP TRIGGER IF EXISTS {PATIENT_FTS_TABLE}_ad",
+        f"DROP TRIGGER IF EXISTS {PATIENT_FTS_TABLE}_au",
+        f"DROP TABLE IF EXISTS {PATIENT_FTS_TABLE}",
+    ]
+
+
+def ensure_patient_fts(conn) -> bool:
+    """Create and backfill the FTS index if missing or outdated.
+
+    Returns whether full-text search is available.
+    """
+    existing_columns = tuple(
+        row[1]
+        for row in conn.exec_driver_sql(f"PRAGMA table_info({PATIENT_FTS_TABLE})")
+    )
+    if existing_columns == PATIENT_FTS_COLUMNS:
+        return True
+
+    try:
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')"
+        )
+        conn.exec_driver_sql("DROP TABLE temp.fts_probe")
+    except Exception as e:
+        logger.warning(f"FTS5 trigram search unavailable, using LIKE search: {e}")
+        return False
+
+    # Missing, or left over from an older schema version: (re)build it
+    for statement in _drop_statements() + _create_statements():
+        conn.exec_driver_sql(statement)
+
+    logger.info("Patient full-text search index created")
+    return True
+
+
+def has_patient_fts(db: Session) -> bool:
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _availability:
+        _availability[key] = (
+            db.execute(
+                text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+                ),
+                {"name": PATIENT_FTS_TABLE},
+            ).first()
+            is not None
+        )
+    return _availability[key]
+
+
+def build_match_expression(normalized_query: str) -> Optional[str]:
+    """Quote each term as an FTS5 string; all terms must match (AND).
+
+    Returns None when the query has a term too short for the trigram index.
+    """
+    terms = normalized_query.split()
+    if not terms or any(len(term) < MIN_FTS_TERM_LENGTH for term in terms):
+        return None
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
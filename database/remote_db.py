@@ -1,14 +1,48 @@
-from typing import Optional, Dict, List, Any
+import asyncio
+import json as json_lib
 import logging
-from supabase import create_client, Client
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import httpx
+
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Worth retrying: rate limiting and transient server/gateway errors
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class RemoteRequestError(Exception):
+    pass
+
+
+def _quote(value: str) -> str:
+    """Quote a value for a PostgREST logical filter (timestamps contain : and +)."""
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
 
 class RemoteDatabase:
+    """Async client for the Supabase REST (PostgREST) API.
+
+    Requests go through one pooled keep-alive httpx.AsyncClient, at most
+    remote_max_concurrency at a time, with timeouts and retry-with-backoff
+    for transient failures. The client and semaphore belong to the event
+    loop that created them; the desktop app runs each sync in a fresh loop,
+    so they are recreated when the loop changes, and the previous client is
+    closed.
+    """
+
     def __init__(self):
-        self.client: Optional[Client] = None
+        self.base_url: Optional[str] = None
+        self.headers: Dict[str, str] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Request body bytes sent since startup, for upload size logging
+        self.bytes_sent = 0
         self._initialize()
 
     def _initialize(self):
@@ -16,57 +50,260 @@ class RemoteDatabase:
             logger.warning("Supabase credentials not configured. Remote sync disabled.")
             return
 
-        try:
-            self.client = create_client(
-                settings.supabase_url, settings.supabase_anon_key
+        self.base_url = f"{settings.supabase_url.rstrip('/')}/rest/v1"
+        self.headers = {
+            "apikey": settings.supabase_anon_key,
+            "Authorization": f"Bearer {settings.supabase_anon_key}",
+            "Content-Type": "application/json",
+        }
+        logger.info("Supabase REST client configured")
+
+    def is_available(self) -> bool:
+        return self.base_url is not None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            if self._client is not None and not self._client.is_closed:
+                await self._close_client(self._client, self._loop)
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=httpx.Timeout(
+                    settings.remote_timeout_seconds,
+                    connect=settings.remote_connect_timeout_seconds,
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.remote_max_concurrency,
+                    max_keepalive_connections=settings.remote_max_concurrency,
+                ),
             )
-            logger.info("Supabase client initialized successfully")
+            self._semaphore = asyncio.Semaphore(settings.remote_max_concurrency)
+            self._loop = loop
+        return self._client
+
+    async def _close_client(
+        self, client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]
+    ) -> None:
+        """Close a client made on another event loop."""
+        if loop is not None and loop.is_running():
+            # Its connections belong to that loop: close them there
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+        try:
+            await client.aclose()
         except Exception as e:
-            logger.error(f"Failed to initialize Supabase client: {e}")
+            # The loop is gone with its transports; the sockets are closed
+            # when the transports are collected
+            logger.debug(f"Closing the previous HTTP client: {e}")
 
-    def is_available(self) -> bool:
-        return self.client is not None
+    async def _request(
+        self,
+        method: str,
+        table: str,
+        params: Optional[Dict[str, str]] = None,
+        json: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> httpx.Response:
+        client = await self._get_client()
+        attempts = settings.remote_max_retries + 1
+        content = None
+        if json is not None:
+            # Compact UTF-8: Persian text would be 3x larger as \u escapes
+            content = json_lib.dumps(
+                json, ensure_ascii=False, separators=(",", ":")
+            ).encode("utf-8")
+            self.bytes_sent += len(content)
+
+        for attempt in range(1, attempts + 1):
+            try:
+                async with self._semaphore:
+                    response = await client.request(
+                        method,
+                        f"/{table}",
+                        params=params,
+                        content=content,
+                        headers=headers,
+                    )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+                error: Exception = RemoteRequestError(
+                    f"{method} {table} returned {response.status_code}: {response.text}"
+                )
+            except httpx.HTTPStatusError as e:
+                raise RemoteRequestError(
+                    f"{method} {table} returned {e.response.status_code}: "
+                    f"{e.response.text}"
+                ) from e
+            except httpx.TransportError as e:
+                error = e
+
+            if attempt == attempts:
+                raise RemoteRequestError(str(error)) from error
+
+            delay = settings.remote_retry_backoff_seconds * 2 ** (attempt - 1)
+            logger.warning(
+                f"{method} {table} failed ({error}), retry {attempt}/{attempts - 1} "
+                f"in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
 
     async def sync_entity(
         self, table: str, entity_id: str, data: Dict[str, Any]
     ) -> bool:
+        return await self.sync_entities(table, [data])
+
+    async def sync_entities(self, table: str, rows: List[Dict[str, Any]]) -> bool:
+        """Upsert a batch of rows in a single request."""
         if not self.is_available():
             return False
+        if not rows:
+            return True
 
         try:
-            response = (
-                self.client.table(table).upsert(data, on_conflict="id").execute()
+            await self._request(
+                "POST",
+                table,
+                params={"on_conflict": "id"},
+                json=rows,
+                headers={"Prefer": "resolution=merge-duplicates,return=minimal"},
             )
             return True
         except Exception as e:
-            logger.error(f"Failed to sync entity to Supabase: {e}")
+            logger.error(f"Failed to sync {len(rows)} {table} rows to Supabase: {e}")
             return False
 
+    async def update_entities(
+        self, table: str, entity_ids: List[str], values: Dict[str, Any]
+    ) -> Optional[Set[str]]:
+        """Set ``values`` on the existing rows ``entity_ids`` in one PATCH.
+
+        Returns the ids that were updated (rows missing remotely are not
+        in it), or None if the request failed.
+        """
+        if not self.is_available():
+            return None
+        if not entity_ids:
+            return set()
+
+        try:
+            response = await self._request(
+                "PATCH",
+                table,
+                params={
+                    "id": f"in.({','.join(_quote(i) for i in entity_ids)})",
+                    "select": "id",
+                },
+                json=values,
+                headers={"Prefer": "return=representation"},
+            )
+            return {row["id"] for row in response.json()}
+        except Exception as e:
+            logger.error(
+                f"Failed to update {len(entity_ids)} {table} rows in Supabase: {e}"
+            )
+            return None
+
     async def fetch_updates(
-        self, table: str, last_sync: str = None
-    ) -> List[Dict[str, Any]]:
+        self,
+        table: str,
+        after: Optional[Tuple[str, str]] = None,
+        page_size: Optional[int] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield rows changed after the ``(updated_at, id)`` keyset ``after``,
+        one page at a time in (updated_at, id) order.
+
+        The next page is requested while the caller processes the current
+        one. Raises RemoteRequestError if a page cannot be fetched, so the
+        caller keeps its position at the last page it applied.
+        """
         if not self.is_available():
-            return []
+            return
 
+        page_size = page_size or settings.sync_page_size
+        pending = asyncio.ensure_future(self._fetch_page(table, after, page_size))
         try:
-            query = self.client.table(table).select("*")
-            if last_sync:
-                query = query.gt("updated_at", last_sync)
+            while pending is not None:
+                page = await pending
+                pending = None
+                if len(page) == page_size:
+                    last = page[-1]
+                    pending = asyncio.ensure_future(
+                        self._fetch_page(
+                            table, (last["updated_at"], last["id"]), page_size
+                        )
+                    )
+                if page:
+                    yield page
+        finally:
+            if pending is not None:
+                pending.cancel()
 
-            response = query.execute()
-            return response.data
-        except Exception as e:
-            logger.error(f"Failed to fetch updates from Supabase: {e}")
-            return []
+    async def _fetch_page(
+        self,
+        table: str,
+        after: Optional[Tuple[str, str]],
+        page_size: int,
+        select: str = "*",
+    ) -> List[Dict[str, Any]]:
+        params = {
+            "select": select,
+            "order": "updated_at.asc,id.asc",
+            "limit": str(page_size),
+        }
+        if after:
+            updated_at, entity_id = (_quote(value) for value in after)
+            # Rows the server did not stamp (null sorts last) are included
+            # so they are reported below instead of silently never matching
+            params["or"] = (
+                f"(updated_at.gt.{updated_at},"
+                f"and(updated_at.eq.{updated_at},id.gt.{entity_id}),"
+                f"updated_at.is.null)"
+            )
+        response = await self._request("GET", table, params=params)
+        rows = response.json()
+        if any(row["updated_at"] is None for row in rows):
+            raise RemoteRequestError(
+                f"{table} has rows with a null updated_at: the server is missing "
+                f"the triggers of database/supabase_sync.sql, remote changes "
+                f"cannot be downloaded until it is applied"
+            )
+        return rows
+
+    async def has_updates(
+        self, table: str, after: Optional[Tuple[str, str]] = None
+    ) -> bool:
+        """Whether any row changed after the keyset ``after`` (one id fetched).
 
-    async def delete_entity(self, table: str, entity_id: str) -> bool:
+        Raises RemoteRequestError when the server cannot be reached.
+        """
         if not self.is_available():
             return False
+        return bool(await self._fetch_page(table, after, 1, select="id,updated_at"))
 
+    async def delete_entity(
+        self, table: str, entity_id: str, deleted_at: Optional[str] = None
+    ) -> bool:
+        """Soft delete a remote row. The server stamps its updated_at, so
+        other devices download the deletion."""
+        if not self.is_available():
+            return False
+
+        deleted_at = deleted_at or datetime.utcnow().isoformat()
         try:
-            self.client.table(table).update({"deleted_at": "now()"}).eq(
-                "id", entity_id
-            ).execute()
+            await self._request(
+                "PATCH",
+                table,
+                params={"id": f"eq.{entity_id}"},
+                json={"deleted_at": deleted_at},
+                headers={"Prefer": "return=minimal"},
+            )
             return True
         except Exception as e:
             logger.error(f"Failed to delete entity in Supabase: {e}")
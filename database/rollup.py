@@ -0,0 +1,250 @@
+"""Daily revenue rollup maintenance.
+
+daily_revenue_rollup holds one row per (clinic_id, day) with the same
+numbers ReportService used to aggregate from appointments on every report.
+Whenever appointments are written, the affected days are recomputed from the
+raw rows (a handful of rows through the covering revenue index) inside the
+same transaction, so reports only ever read the small rollup table.
+
+Rebuild or verify from the command line:
+
+    python -m app.database.rollup rebuild [--clinic CLINIC_ID]
+    python -m app.database.rollup check [--clinic CLINIC_ID]
+"""
+
+import argparse
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .models import Appointment, DailyRevenueRollup
+
+logger = logging.getLogger(__name__)
+
+RollupKey = Tuple[str, date]
+
+# Requested days closer than this are refreshed with one range query
+REFRESH_WINDOW_GAP_DAYS = 7
+
+_COUNTERS = (
+    "appointment_count",
+    "completed_count",
+    "cancelled_count",
+    "revenue",
+    "paid",
+)
+
+
+def _aggregates():
+    return (
+        func.count().label("appointment_count"),
+        func.count()
+        .filter(Appointment.status == "completed")
+        .label("completed_count"),
+        func.count()
+        .filter(Appointment.status == "cancelled")
+        .label("cancelled_count"),
+        func.coalesce(func.sum(Appointment.visit_fee), 0).label("revenue"),
+        func.coalesce(func.sum(Appointment.paid_amount), 0).label("paid"),
+    )
+
+
+def to_day(value: Union[date, datetime, str, None]) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)).date()
+
+
+def appointment_day_keys(conn, appointment_ids: Iterable[str]) -> List[RollupKey]:
+    """Current (clinic_id, day) of the given appointments, as stored."""
+    ids = list(appointment_ids)
+    if not ids:
+        return []
+    rows = conn.execute(
+        select(Appointment.clinic_id, Appointment.appointment_date).where(
+            Appointment.id.in_(ids)
+        )
+    )
+    return [(row.clinic_id, to_day(row.appointment_date)) for row in rows]
+
+
+def _day_windows(days: List[date]) -> List[Tuple[date, date]]:
+    """Group sorted days into [first, last] windows with small gaps, so a
+    bulk refresh reads each stretch of appointments in one range query."""
+    windows = []
+    for day in days:
+        if windows and (day - windows[-1][1]).days <= REFRESH_WINDOW_GAP_DAYS:
+            windows[-1] = (windows[-1][0], day)
+        else:
+            windows.append((day, day))
+    return windows
+
+
+def refresh_rollup_days(conn, keys: Iterable[Tuple[str, object]]) -> None:
+    """Recompute the rollup rows for the given (clinic_id, day) pairs.
+
+    ``conn`` is a Session or Connection; pending ORM changes must already be
+    flushed so the raw rows reflect them.
+    """
+    days_by_clinic: Dict[str, set] = {}
+    for clinic_id, day in keys:
+        day = to_day(day)
+        if clinic_id and day:
+            days_by_clinic.setdefault(clinic_id, set()).add(day)
+
+    now = datetime.utcnow()
+    for clinic_id, days in days_by_clinic.items():
+        totals = {}
+        day_expr = func.date(Appointment.appointment_date).label("day")
+        for first, last in _day_windows(sorted(days)):
+            start = datetime.combine(first, time.min)
+            end = datetime.combine(last, time.min) + timedelta(days=1)
+            rows = conn.execute(
+                select(day_expr, *_aggregates())
+                .where(
+                    Appointment.clinic_id == clinic_id,
+                    Appointment.deleted_at.is_(None),
+                    Appointment.appointment_date >= start,
+                    Appointment.appointment_date < end,
+                )
+                .group_by(day_expr)
+            )
+            for row in rows:
+                day = to_day(row.day)
+                if day in days:
+                    totals[day] = {name: getattr(row, name) for name in _COUNTERS}
+
+        empty = days - totals.keys()
+        if empty:
+            conn.execute(
+                delete(DailyRevenueRollup).where(
+                    DailyRevenueRollup.clinic_id == clinic_id,
+                    DailyRevenueRollup.day.in_(empty),
+                )
+            )
+        if totals:
+            stmt = sqlite_insert(DailyRevenueRollup)
+            conn.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["clinic_id", "day"],
+                    set_={
+                        name: stmt.excluded[name]
+                        for name in _COUNTERS + ("updated_at",)
+                    },
+                ),
+                [
+                    {"clinic_id": clinic_id, "day": day, **values, "updated_at": now}
+                    for day, values in totals.items()
+                ],
+            )
+
+
+def _raw_daily_totals(conn, clinic_id: Optional[str] = None):
+    day = func.date(Appointment.appointment_date).label("day")
+    query = (
+        select(Appointment.clinic_id, day, *_aggregates())
+        .where(Appointment.deleted_at.is_(None))
+        .group_by(Appointment.clinic_id, day)
+    )
+    if clinic_id:
+        query = query.where(Appointment.clinic_id == clinic_id)
+    return conn.execute(query)
+
+
+def rebuild_rollup(conn, clinic_id: Optional[str] = None) -> int:
+    """Recreate the rollup from raw appointments. Returns rows written."""
+    clear = delete(DailyRevenueRollup)
+    if clinic_id:
+        clear = clear.where(DailyRevenueRollup.clinic_id == clinic_id)
+    conn.execute(clear)
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "clinic_id": row.clinic_id,
+            "day": to_day(row.day),
+            **{name: getattr(row, name) for name in _COUNTERS},
+            "updated_at": now,
+        }
+        for row in _raw_daily_totals(conn, clinic_id)
+    ]
+    if rows:
+        conn.execute(sqlite_insert(DailyRevenueRollup), rows)
+
+    logger.info(f"Daily revenue rollup rebuilt ({len(rows)} days)")
+    return len(rows)
+
+
+def ensure_rollup(conn) -> None:
+    """Build the rollup once for databases created before it existed."""
+    has_rollup = conn.execute(select(DailyRevenueRollup.day).limit(1)).first()
+    has_appointments = conn.execute(select(Appointment.id).limit(1)).first()
+    if has_appointments and not has_rollup:
+        rebuild_rollup(conn)
+
+
+def check_rollup_consistency(conn, clinic_id: Optional[str] = None) -> List[Dict]:
+    """Compare the rollup with raw appointments; returns mismatching days."""
+    expected: Dict[RollupKey, Dict] = {
+        (row.clinic_id, to_day(row.day)): {n: getattr(row, n) for n in _COUNTERS}
+        for row in _raw_daily_totals(conn, clinic_id)
+    }
+
+    query = DailyRevenueRollup.__table__.select()
+    if clinic_id:
+        query = query.where(DailyRevenueRollup.clinic_id == clinic_id)
+    actual: Dict[RollupKey, Dict] = {
+        (row.clinic_id, row.day): {n: getattr(row, n) for n in _COUNTERS}
+        for row in conn.execute(query)
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        want, have = expected.get(key), actual.get(key)
+        if want is None or have is None or any(
+            float(want[n]) != float(have[n]) for n in _COUNTERS
+        ):
+            mismatches.append(
+                {
+                    "clinic_id": key[0],
+                    "day": key[1].isoformat(),
+                    "expected": want,
+                    "actual": have,
+                }
+            )
+    return mismatches
+
+
+def main(argv=None) -> int:
+    from .local_db import local_db
+
+    parser = argparse.ArgumentParser(description="Daily revenue rollup tools")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--clinic", dest="clinic_id", default=None)
+    args = parser.parse_args(argv)
+
+    with local_db.engine.begin() as conn:
+        if args.command == "rebuild":
+            count = rebuild_rollup(conn, args.clinic_id)
+            print(f"Rebuilt {count} day(s)")
+            return 0
+
+        mismatches = check_rollup_consistency(conn, args.clinic_id)
+        for mismatch in mismatches:
+            print(
+                f"{mismatch['clinic_id']} {mismatch['day']}: "
+                f"expected {mismatch['expected']}, found {mismatch['actual']}"
+            )
+        print(f"{len(mismatches)} mismatching day(s)")
+        return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
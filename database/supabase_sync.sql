@@ -0,0 +1,37 @@
+-- Server-side part of sync, run once in the Supabase SQL editor.
+--
+-- Downloads page through the synced tables by (updated_at, id) and keep
+-- the last position as their watermark (database/sync_state.py). That
+-- only works if updated_at comes from one clock, the server's: clients do
+-- not upload it, and this trigger overwrites it on every insert and
+-- update, so rows uploaded late by a device that was offline still sort
+-- after everything other devices have already downloaded.
+
+create or replace function clinic_crm_stamp_updated_at() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at := clock_timestamp();
+    return new;
+end;
+$$;
+
+drop trigger if exists clinics_stamp_updated_at on clinics;
+create trigger clinics_stamp_updated_at
+    before insert or update on clinics
+    for each row execute function clinic_crm_stamp_updated_at();
+
+drop trigger if exists patients_stamp_updated_at on patients;
+create trigger patients_stamp_updated_at
+    before insert or update on patients
+    for each row execute function clinic_crm_stamp_updated_at();
+
+drop trigger if exists appointments_stamp_updated_at on appointments;
+create trigger appointments_stamp_updated_at
+    before insert or update on appointments
+    for each row execute function clinic_crm_stamp_updated_at();
+
+-- Keyset pages of the download
+create index if not exists clinics_updated_at_id on clinics (updated_at, id);
+create index if not exists patients_updated_at_id on patients (updated_at, id);
+create index if not exists appointments_updated_at_id
+    on appointments (updated_at, id);
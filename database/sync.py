@@ -1,24 +1,78 @@
 import asyncio
 import logging
-from datetime import datetime, date
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, date, timezone
 from decimal import Decimal
-from typing import List, Dict, Any, Optional
-from sqlalchemy import and_, or_
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import Date, DateTime, Numeric, Row, and_, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 from app.config import settings
-from .models import Clinic, Patient, Appointment, SyncLog, Base
+from .models import Clinic, Patient, Appointment, SyncLog, SyncOutbox, SyncState, Base
 from .local_db import local_db
 from .remote_db import remote_db
+from .patient_search import patient_search_keys
+from .rollup import appointment_day_keys, refresh_rollup_days
+from .outbox import acknowledge, changed_columns, pending_changes, queued_ids
+from .sync_log import maintain_sync_logs
+from .sync_state import (
+    SERVER_ORDERING_COLUMN,
+    download_watermark,
+    get_sync_state,
+    set_download_watermark,
+)
 
 logger = logging.getLogger(__name__)
 
+# Session.info flag: writes of this session do not wake the sync scheduler
+SKIP_NOTIFY_KEY = "skip_sync_notify"
+
+# Ids per PATCH request (they go in the URL, as id=in.(...))
+PATCH_IDS_PER_REQUEST = 100
+
+
+def _parse_datetime(value: Any) -> datetime:
+    # Remote timestamps carry an offset, local ones are naive UTC
+    if not isinstance(value, str):
+        return value
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_date(value: Any) -> date:
+    return date.fromisoformat(value[:10]) if isinstance(value, str) else value
+
+
+def _parse_decimal(value: Any) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+@lru_cache(maxsize=None)
+def _column_converters(model_class) -> Dict[str, Optional[Callable[[Any], Any]]]:
+    """Column name -> function turning a JSON value into the column's type."""
+    converters = {}
+    for column in model_class.__table__.columns:
+        if isinstance(column.type, DateTime):
+            converters[column.name] = _parse_datetime
+        elif isinstance(column.type, Date):
+            converters[column.name] = _parse_date
+        elif isinstance(column.type, Numeric):
+            converters[column.name] = _parse_decimal
+        else:
+            converters[column.name] = None
+    return converters
+
 
 class SyncEngine:
     def __init__(self):
         self.sync_enabled = settings.app_mode in ["online", "hybrid"]
         self.sync_interval = settings.sync_interval_minutes * 60
-        self.running = False
+        self.batch_size = max(1, settings.sync_batch_size)
 
     def _get_entity_mapping(self) -> Dict[str, Any]:
         return {
@@ -30,6 +84,8 @@ class SyncEngine:
     def _model_to_dict(self, obj: Base) -> Dict[str, Any]:
         data = {}
         for column in obj.__table__.columns:
+            if column.info.get("local_only") or column.name == SERVER_ORDERING_COLUMN:
+                continue
             value = getattr(obj, column.name)
             if value is None:
                 data[column.name] = None
@@ -43,7 +99,21 @@ class SyncEngine:
                 data[column.name] = value
         return data
 
-    async def sync_to_remote(self, session: Session) -> bool:
+    @contextmanager
+    def _write_session(self) -> Iterator[Session]:
+        """A short write transaction that does not wake the sync scheduler."""
+        with local_db.get_session() as session:
+            session.info[SKIP_NOTIFY_KEY] = True
+            yield session
+
+    async def sync_to_remote(self, sync_id: Optional[str] = None) -> bool:
+        """Upload the changes queued in the outbox, table by table.
+
+        Each table is read from a snapshot on a read connection, uploaded
+        with no database connection held, and its outcome written in one
+        short transaction, so local edits are never blocked by the network.
+        Changes made meanwhile stay queued (see outbox.acknowledge).
+        """
         if not remote_db.is_available():
             logger.warning("Remote database not available for sync")
             return False
@@ -53,62 +123,233 @@ class SyncEngine:
 
         for table_name, model_class in entity_mapping.items():
             try:
-                pending_entities = (
-                    session.query(model_class)
-                    .filter(
-                        model_class.deleted_at.is_(None),
-                        or_(
-                            model_class.sync_status == "pending",
-                            model_class.last_synced_at.is_(None),
-                            model_class.last_synced_at < model_class.updated_at,
-                        ),
+                with local_db.get_session(readonly=True) as session:
+                    changes = pending_changes(session, table_name)
+                    rows = self._load_rows(
+                        session, model_class, [change.entity_id for change in changes]
                     )
-                    .all()
+                if not changes:
+                    continue
+
+                # Gone locally (never synced rows removed by hand): nothing to send
+                missing = [c for c in changes if c.entity_id not in rows]
+                upserts = [
+                    c
+                    for c in changes
+                    if c.entity_id in rows and rows[c.entity_id]["deleted_at"] is None
+                ]
+                deletes = [
+                    c
+                    for c in changes
+                    if c.entity_id in rows
+                    and rows[c.entity_id]["deleted_at"] is not None
+                ]
+
+                inserts, updates, unchanged = self._upload_requests(upserts, rows)
+                bytes_before = remote_db.bytes_sent
+                # Requests of one table go out concurrently; tables stay in
+                # order so parents exist remotely before their children
+                results = await asyncio.gather(
+                    *(
+                        self._send_insert(table_name, batch, payload)
+                        for batch, payload in inserts
+                    ),
+                    *(
+                        self._send_update(table_name, batch, values, rows)
+                        for batch, values in updates
+                    ),
+                    *(
+                        self._send_delete(table_name, change, rows)
+                        for change in deletes
+                    ),
                 )
-
-                for entity in pending_entities:
-                    data = self._model_to_dict(entity)
-
-                    sync_success = await remote_db.sync_entity(
-                        table_name, entity.id, data
-                    )
-
-                    if sync_success:
-                        entity.sync_status = "synced"
-                        entity.last_synced_at = datetime.utcnow()
-
-                        sync_log = SyncLog(
-                            entity_type=table_name,
-                            entity_id=entity.id,
-                            operation="upload",
-                            sync_direction="local_to_remote",
-                            status="success",
+                outcomes = [(unchanged, True)] + [
+                    outcome for result in results for outcome in result
+                ]
+
+                with self._write_session() as session:
+                    acknowledge(session, table_name, missing)
+                    for batch, batch_success in outcomes:
+                        if not batch:
+                            continue
+                        if batch_success:
+                            acknowledge(session, table_name, batch)
+                        else:
+                            success = False
+                        self._record_upload(
+                            session,
+                            model_class,
+                            [change.entity_id for change in batch],
+                            batch_success,
+                            sync_id,
                         )
-                        session.add(sync_log)
-                    else:
-                        entity.sync_status = "failed"
-                        sync_log = SyncLog(
-                            entity_type=table_name,
-                            entity_id=entity.id,
-                            operation="upload",
-                            sync_direction="local_to_remote",
-                            status="failed",
-                            error_message="Failed to sync to remote",
-                        )
-                        session.add(sync_log)
-                        success = False
 
-                session.commit()
-                logger.info(f"Synced {len(pending_entities)} {table_name} to remote")
+                logger.info(
+                    f"Synced {len(upserts)} {table_name} and "
+                    f"{len(deletes)} deletions to remote "
+                    f"({remote_db.bytes_sent - bytes_before} bytes)"
+                )
 
             except Exception as e:
                 logger.error(f"Error syncing {table_name} to remote: {e}")
-                session.rollback()
                 success = False
 
         return success
 
-    async def sync_from_remote(self, session: Session) -> bool:
+    def _upload_requests(
+        self, changes: List[Row], rows: Dict[str, Dict[str, Any]]
+    ) -> Tuple[
+        List[Tuple[List[Row], List[Dict]]], List[Tuple[List[Row], Dict]], List[Row]
+    ]:
+        """Split upserts into whole-row inserts, column updates and changes
+        with nothing to send.
+
+        Rows that may not exist remotely yet (new, or never uploaded) are
+        sent whole as bulk upserts, in (changes, rows) batches. Rows known
+        on the server only send the columns changed since their last
+        upload, as PATCH requests: an upsert would fail on them, as
+        PostgreSQL checks NOT NULL columns on the proposed insert row
+        before it resolves the conflict. Rows with the same changed values
+        share one PATCH; updates are (changes, values) pairs. Entries whose
+        tracked columns did not actually change (queued before the triggers
+        ignored such updates) send nothing and are just acknowledged.
+        """
+        inserts: List[Tuple[Row, Dict]] = []
+        groups: Dict[Tuple, List[Row]] = {}
+        unchanged: List[Row] = []
+        for change in changes:
+            full = rows[change.entity_id]
+            columns = changed_columns(change)
+            if columns is None or full["last_synced_at"] is None:
+                inserts.append((change, full))
+                continue
+            values = tuple(
+                (key, value) for key, value in full.items() if key in columns
+            )
+            if not values:
+                unchanged.append(change)
+                continue
+            groups.setdefault(values, []).append(change)
+
+        insert_batches = [
+            (
+                [change for change, _ in inserts[start : start + self.batch_size]],
+                [row for _, row in inserts[start : start + self.batch_size]],
+            )
+            for start in range(0, len(inserts), self.batch_size)
+        ]
+        updates = [
+            (group[start : start + PATCH_IDS_PER_REQUEST], dict(values))
+            for values, group in groups.items()
+            for start in range(0, len(group), PATCH_IDS_PER_REQUEST)
+        ]
+        return insert_batches, updates, unchanged
+
+    async def _send_insert(
+        self, table_name: str, batch: List[Row], payload: List[Dict[str, Any]]
+    ) -> List[Tuple[List[Row], bool]]:
+        return [(batch, await remote_db.sync_entities(table_name, payload))]
+
+    async def _send_update(
+        self,
+        table_name: str,
+        batch: List[Row],
+        values: Dict[str, Any],
+        rows: Dict[str, Dict[str, Any]],
+    ) -> List[Tuple[List[Row], bool]]:
+        updated = await remote_db.update_entities(
+            table_name, [change.entity_id for change in batch], values
+        )
+        if updated is None:
+            return [(batch, False)]
+        outcomes = [([change for change in batch if change.entity_id in updated], True)]
+        missing = [change for change in batch if change.entity_id not in updated]
+        if missing:
+            # e.g. removed remotely by hand: recreate from the whole row
+            logger.warning(
+                f"{len(missing)} {table_name} rows missing remotely, sending whole rows"
+            )
+            ok = await remote_db.sync_entities(
+                table_name, [rows[change.entity_id] for change in missing]
+            )
+            outcomes.append((missing, ok))
+        return outcomes
+
+    async def _send_delete(
+        self, table_name: str, change: Row, rows: Dict[str, Dict[str, Any]]
+    ) -> List[Tuple[List[Row], bool]]:
+        deleted = await remote_db.delete_entity(
+            table_name, change.entity_id, rows[change.entity_id]["deleted_at"]
+        )
+        return [([change], deleted)]
+
+    def _load_rows(
+        self, session: Session, model_class, ids: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Upload payloads (see _model_to_dict) of the given rows by id."""
+        rows = {}
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(ids), 10000):
+            chunk = ids[start : start + 10000]
+            for entity in session.query(model_class).filter(model_class.id.in_(chunk)):
+                rows[entity.id] = self._model_to_dict(entity)
+        return rows
+
+    def _record_upload(
+        self,
+        session: Session,
+        model_class,
+        entity_ids: List[str],
+        batch_success: bool,
+        sync_id: Optional[str] = None,
+    ) -> None:
+        """Record the outcome of one upload request on every row in it.
+
+        Call after acknowledging the batch: a row edited again during the
+        upload still has an outbox entry and keeps its pending status.
+        """
+        table_name = model_class.__tablename__
+        now = datetime.utcnow()
+        values = {"sync_status": "synced" if batch_success else "failed"}
+        query = update(model_class).where(model_class.id.in_(entity_ids))
+        if batch_success:
+            values["last_synced_at"] = now
+            query = query.where(
+                ~select(SyncOutbox.id)
+                .where(
+                    SyncOutbox.entity_type == table_name,
+                    SyncOutbox.entity_id == model_class.id,
+                )
+                .exists()
+            )
+        # updated_at is set to itself so its onupdate does not fire: the
+        # row has not changed, it must not look modified after the upload
+        session.execute(
+            query.values(updated_at=model_class.updated_at, **values).execution_options(
+                synchronize_session=False
+            )
+        )
+
+        session.execute(
+            insert(SyncLog.__table__),
+            [
+                {
+                    "entity_type": table_name,
+                    "entity_id": entity_id,
+                    "operation": "upload",
+                    "sync_direction": "local_to_remote",
+                    "status": "success" if batch_success else "failed",
+                    "error_message": (
+                        None if batch_success else "Failed to sync to remote"
+                    ),
+                    "sync_id": sync_id,
+                    "created_at": now,
+                }
+                for entity_id in entity_ids
+            ],
+        )
+
+    async def sync_from_remote(self, sync_id: Optional[str] = None) -> bool:
         if not remote_db.is_available():
             logger.warning("Remote database not available for sync")
             return False
@@ -116,56 +357,149 @@ class SyncEngine:
         entity_mapping = self._get_entity_mapping()
         success = True
 
+        # Tables in dependency order, each streamed page by page. Every page
+        # is applied in its own short transaction together with the table's
+        # watermark, so an interrupted sync resumes after the last applied
+        # page and no write lock is held while waiting for the next one
         for table_name, model_class in entity_mapping.items():
+            applied = 0
             try:
-                last_sync = (
-                    session.query(model_class.last_synced_at)
-                    .order_by(model_class.last_synced_at.desc())
-                    .first()
-                )
+                with local_db.get_session(readonly=True) as session:
+                    after = download_watermark(
+                        session.get(SyncState, table_name),
+                        overlap_seconds=settings.sync_download_overlap_seconds,
+                    )
+                async for page in remote_db.fetch_updates(table_name, after):
+                    rows = self._prepare_remote_rows(model_class, page)
+                    with self._write_session() as session:
+                        self._apply_remote_page(
+                            session, table_name, model_class, rows, sync_id
+                        )
+                        set_download_watermark(
+                            get_sync_state(session, table_name), page[-1]
+                        )
+                    applied += len(page)
 
-                last_sync_time = (
-                    last_sync[0].isoformat() if last_sync and last_sync[0] else None
-                )
+                logger.info(f"Synced {applied} {table_name} from remote")
 
-                remote_updates = await remote_db.fetch_updates(
-                    table_name, last_sync_time
+            except Exception as e:
+                logger.error(
+                    f"Error syncing {table_name} from remote after {applied} rows: {e}"
                 )
+                success = False
 
-                for remote_data in remote_updates:
-                    entity_id = remote_data.get("id")
-                    existing = session.query(model_class).filter_by(id=entity_id).first()
-
-                    if existing:
-                        for key, value in remote_data.items():
-                            if hasattr(existing, key) and key not in ["id"]:
-                                setattr(existing, key, value)
-                        existing.last_synced_at = datetime.utcnow()
-                    else:
-                        new_entity = model_class(**remote_data)
-                        new_entity.last_synced_at = datetime.utcnow()
-                        session.add(new_entity)
-
-                    sync_log = SyncLog(
-                        entity_type=table_name,
-                        entity_id=entity_id,
-                        operation="download",
-                        sync_direction="remote_to_local",
-                        status="success",
-                    )
-                    session.add(sync_log)
+        return success
 
-                session.commit()
-                logger.info(
-                    f"Synced {len(remote_updates)} {table_name} from remote"
+    def _remote_to_row(self, model_class, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Inverse of _model_to_dict: coerce JSON values to the column types.
+
+        Keys without a local column are dropped.
+        """
+        converters = _column_converters(model_class)
+        row = {}
+        for key, value in data.items():
+            if key not in converters:
+                continue
+            convert = converters[key]
+            row[key] = value if value is None or convert is None else convert(value)
+        return row
+
+    def _prepare_remote_rows(
+        self, model_class, remote_updates: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Local rows for a page of remote rows, computed before the page's
+        write transaction starts."""
+        now = datetime.utcnow()
+        rows = []
+        for data in remote_updates:
+            row = self._remote_to_row(model_class, data)
+            row["last_synced_at"] = now
+            row["sync_status"] = "synced"
+            if model_class is Patient:
+                row.update(
+                    patient_search_keys(
+                        row.get("first_name"),
+                        row.get("last_name"),
+                        row.get("national_id"),
+                        row.get("phone"),
+                        row.get("mobile"),
+                    )
                 )
+            rows.append(row)
+        return rows
+
+    def _apply_remote_page(
+        self,
+        session: Session,
+        table_name: str,
+        model_class,
+        rows: List[Dict[str, Any]],
+        sync_id: Optional[str] = None,
+    ) -> None:
+        """Upsert one page of prepared rows with set-based statements.
+
+        Rows with a local change still in the outbox are skipped: the
+        change is uploaded next, and the server row, stamped by that
+        upload, comes back on a later download. The check runs in the
+        page's write transaction, so a local edit either commits before it
+        (and is seen) or after the page (and is captured as a new change).
+
+        One IN query finds which rows already exist (and, for appointments,
+        the days they were on), then INSERT ... ON CONFLICT DO UPDATE writes
+        the page, one executemany per distinct set of columns.
+        """
+        now = datetime.utcnow()
+        queued = queued_ids(session, table_name, [row["id"] for row in rows])
+        rows = [row for row in rows if row["id"] not in queued]
+        ids = [row["id"] for row in rows]
+        if not rows:
+            logger.debug(f"Kept {len(queued)} {table_name} with local changes")
+            return
+        existing_ids = set(
+            session.execute(
+                select(model_class.id).where(model_class.id.in_(ids))
+            ).scalars()
+        )
+        rollup_keys = []
+        if model_class is Appointment:
+            rollup_keys = appointment_day_keys(session, existing_ids)
+
+        by_columns: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_columns.setdefault(tuple(sorted(row)), []).append(row)
+        for columns, group in by_columns.items():
+            stmt = sqlite_insert(model_class.__table__)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["id"],
+                set_={name: stmt.excluded[name] for name in columns if name != "id"},
+            )
+            session.execute(stmt, group)
+
+        session.execute(
+            insert(SyncLog.__table__),
+            [
+                {
+                    "entity_type": table_name,
+                    "entity_id": entity_id,
+                    "operation": "download",
+                    "sync_direction": "remote_to_local",
+                    "status": "success",
+                    "sync_id": sync_id,
+                    "created_at": now,
+                }
+                for entity_id in ids
+            ],
+        )
 
-            except Exception as e:
-                logger.error(f"Error syncing {table_name} from remote: {e}")
-                session.rollback()
-                success = False
+        if model_class is Appointment:
+            rollup_keys.extend(appointment_day_keys(session, ids))
+            refresh_rollup_days(session, rollup_keys)
 
-        return success
+        logger.debug(
+            f"Applied {len(rows)} {table_name} from remote "
+            f"({len(rows) - len(existing_ids)} new, "
+            f"{len(queued)} kept with local changes)"
+        )
 
     async def perform_sync(self) -> Dict[str, bool]:
         if not self.sync_enabled:
@@ -174,9 +508,15 @@ class SyncEngine:
 
         logger.info("Starting synchronization...")
 
-        with local_db.get_session() as session:
-            to_remote = await self.sync_to_remote(session)
-            from_remote = await self.sync_from_remote(session)
+        sync_id = str(uuid.uuid4())
+        to_remote = await self.sync_to_remote(sync_id)
+        from_remote = await self.sync_from_remote(sync_id)
+
+        try:
+            with local_db.engine.begin() as conn:
+                maintain_sync_logs(conn)
+        except Exception as e:
+            logger.error(f"Sync log maintenance failed: {e}")
 
         logger.info(
             f"Sync completed. To remote: {to_remote}, From remote: {from_remote}"
@@ -184,25 +524,5 @@ class SyncEngine:
 
         return {"to_remote": to_remote, "from_remote": from_remote}
 
-    async def start_auto_sync(self):
-        if not settings.auto_sync_enabled or not self.sync_enabled:
-            logger.info("Auto-sync is disabled")
-            return
-
-        self.running = True
-        logger.info(f"Auto-sync started with interval: {self.sync_interval}s")
-
-        while self.running:
-            try:
-                await self.perform_sync()
-            except Exception as e:
-                logger.error(f"Error in auto-sync: {e}")
-
-            await asyncio.sleep(self.sync_interval)
-
-    def stop_auto_sync(self):
-        self.running = False
-        logger.info("Auto-sync stopped")
-
 
 sync_engine = SyncEngine()
@@ -0,0 +1,123 @@
+"""Sync log housekeeping.
+
+SyncEngine writes one sync_logs row per entity per direction on every
+sync. Those details matter for recent troubleshooting only, so after each
+sync:
+
+- successful per-entity rows older than ``sync_log_detail_days`` are
+  folded into one summary row per (sync run, table, operation, direction)
+  with entity_id "*" and the number of entities in item_count; failures
+  keep their per-entity rows,
+- rows older than ``sync_log_retention_days`` are deleted,
+- the oldest rows beyond ``sync_log_max_rows`` are deleted.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import delete, func, insert, literal, select
+
+from app.config import settings
+from .models import SyncLog
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_ENTITY_ID = "*"
+
+
+def compact_sync_logs(conn, older_than: datetime) -> int:
+    """Fold successful detail rows older than ``older_than`` into summaries.
+
+    Returns the number of detail rows removed.
+    """
+    details = (
+        SyncLog.status == "success",
+        SyncLog.created_at < older_than,
+        SyncLog.entity_id != SUMMARY_ENTITY_ID,
+    )
+    group = (
+        SyncLog.sync_id,
+        SyncLog.entity_type,
+        SyncLog.operation,
+        SyncLog.sync_direction,
+        SyncLog.status,
+    )
+    summaries = (
+        select(
+            *group,
+            literal(SUMMARY_ENTITY_ID),
+            func.sum(func.coalesce(SyncLog.item_count, 1)),
+            func.max(SyncLog.created_at),
+        )
+        .where(*details)
+        .group_by(*group)
+    )
+    conn.execute(
+        insert(SyncLog.__table__).from_select(
+            [
+                "sync_id",
+                "entity_type",
+                "operation",
+                "sync_direction",
+                "status",
+                "entity_id",
+                "item_count",
+                "created_at",
+            ],
+            summaries,
+        )
+    )
+    return conn.execute(delete(SyncLog).where(*details)).rowcount
+
+
+def prune_sync_logs(
+    conn, older_than: Optional[datetime] = None, max_rows: int = 0
+) -> int:
+    """Delete rows older than ``older_than`` and the oldest beyond
+    ``max_rows``. Returns the number of rows deleted."""
+    removed = 0
+    if older_than is not None:
+        removed += conn.execute(
+            delete(SyncLog).where(SyncLog.created_at < older_than)
+        ).rowcount
+
+    if max_rows:
+        excess = conn.execute(select(func.count()).select_from(SyncLog)).scalar()
+        excess -= max_rows
+        if excess > 0:
+            oldest = (
+                select(SyncLog.id)
+                .order_by(SyncLog.created_at, SyncLog.id)
+                .limit(excess)
+                .scalar_subquery()
+            )
+            removed += conn.execute(
+                delete(SyncLog).where(SyncLog.id.in_(oldest))
+            ).rowcount
+    return removed
+
+
+def maintain_sync_logs(conn) -> Dict[str, int]:
+    """Compaction and retention with the limits from Settings."""
+    now = datetime.utcnow()
+    result = {"compacted": 0, "deleted": 0}
+    if settings.sync_log_detail_days:
+        result["compacted"] = compact_sync_logs(
+            conn, now - timedelta(days=settings.sync_log_detail_days)
+        )
+    result["deleted"] = prune_sync_logs(
+        conn,
+        older_than=(
+            now - timedelta(days=settings.sync_log_retention_days)
+            if settings.sync_log_retention_days
+            else None
+        ),
+        max_rows=settings.sync_log_max_rows,
+    )
+    if result["compacted"] or result["deleted"]:
+        logger.info(
+            f"Sync log: {result['compacted']} rows compacted, "
+            f"{result['deleted']} deleted"
+        )
+    return result
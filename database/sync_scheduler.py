@@ -0,0 +1,259 @@
+"""Background sync scheduler.
+
+One thread with its own event loop runs every sync, debounced after local
+commits, periodic otherwise and with backoff after failures.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from .local_db import local_db
+from .models import SyncState
+from .outbox import queue_depth
+from .remote_db import remote_db
+from .sync import SKIP_NOTIFY_KEY, sync_engine
+from .sync_state import SYNCED_MODELS, download_watermark
+
+logger = logging.getLogger(__name__)
+
+# Session.info flag: the session committed changes to synced tables
+_CHANGES_KEY = "sync_changes"
+
+_SYNCED_TABLES = {model.__table__ for model in SYNCED_MODELS}
+
+
+class SyncScheduler:
+    def __init__(self):
+        self.debounce = settings.sync_debounce_seconds
+        self.interval = settings.sync_interval_minutes * 60
+        self.max_backoff = settings.sync_max_backoff_minutes * 60
+        self.next_run_at: Optional[datetime] = None
+        self.last_run_at: Optional[datetime] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.failures = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wake: Optional[asyncio.Event] = None
+        # Serializes scheduled and manual cycles, on the scheduler loop
+        self._cycle_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        if not sync_engine.sync_enabled or not settings.auto_sync_enabled:
+            logger.info("Sync scheduler disabled")
+            return
+
+        ready = threading.Event()
+        self._stopping = False
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._wake = asyncio.Event()
+            self._cycle_lock = asyncio.Lock()
+            ready.set()
+            try:
+                self._loop.run_until_complete(self._run())
+                self._loop.run_until_complete(remote_db.close())
+            finally:
+                self._loop.close()
+                self._loop = None
+
+        self._thread = threading.Thread(target=run, name="sync-scheduler", daemon=True)
+        self._thread.start()
+        ready.wait()
+        # First cycle shortly after startup
+        self._schedule(self.debounce)
+        logger.info(f"Sync scheduler started (interval {self.interval}s)")
+
+    def stop(self, timeout: float = 30):
+        if not self.running:
+            return
+        self._stopping = True
+        self._loop.call_soon_threadsafe(self._wake.set)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        logger.info("Sync scheduler stopped")
+
+    def notify_change(self):
+        """Local data changed: sync after the debounce delay. Thread-safe.
+
+        Ignored while backing off, so edits do not hammer an unreachable
+        server.
+        """
+        if self.running and not self.failures:
+            self._schedule(self.debounce)
+
+    def _schedule(self, delay: float):
+        """Run no later than ``delay`` seconds from now."""
+        run_at = datetime.utcnow() + timedelta(seconds=delay)
+        with self._lock:
+            if self.next_run_at is None or run_at < self.next_run_at:
+                self.next_run_at = run_at
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        while not self._stopping:
+            with self._lock:
+                run_at = self.next_run_at
+            delay = (
+                (run_at - datetime.utcnow()).total_seconds()
+                if run_at
+                else self.interval
+            )
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                    continue  # rescheduled or stopping
+                except asyncio.TimeoutError:
+                    pass
+
+            with self._lock:
+                self.next_run_at = None
+            try:
+                await self._cycle(force=False)
+            except Exception as e:
+                logger.error(f"Scheduled sync failed: {e}")
+
+    async def _cycle(self, force: bool) -> Dict[str, Any]:
+        """Run one sync (unless there is nothing to do and not ``force``)
+        and schedule the next one. A manual sync requested during a
+        scheduled one waits for it to finish."""
+        async with self._cycle_lock:
+            return await self._run_cycle(force)
+
+    async def _run_cycle(self, force: bool) -> Dict[str, Any]:
+        try:
+            if not force and not await self._has_work():
+                result = {"to_remote": True, "from_remote": True}
+                logger.debug("Sync skipped, no local or remote changes")
+            else:
+                result = await sync_engine.perform_sync()
+        except Exception as e:
+            self._finish({"to_remote": False, "from_remote": False, "error": str(e)})
+            raise
+        self._finish(result)
+        return result
+
+    def _finish(self, result: Dict[str, Any]):
+        self.last_run_at = datetime.utcnow()
+        self.last_result = result
+        if result.get("to_remote") and result.get("from_remote"):
+            self.failures = 0
+            self._schedule(self.interval)
+            return
+
+        self.failures += 1
+        backoff = min(self.max_backoff, max(self.debounce, 1.0) * 2 ** self.failures)
+        logger.warning(
+            f"Sync failed {self.failures} time(s) in a row, retrying in "
+            f"{backoff:.0f}s"
+        )
+        self._schedule(backoff)
+
+    async def _has_work(self) -> bool:
+        with local_db.get_session(readonly=True) as session:
+            if queue_depth(session):
+                return True
+            watermarks = {
+                model.__tablename__: download_watermark(
+                    session.get(SyncState, model.__tablename__)
+                )
+                for model in SYNCED_MODELS
+            }
+        for table_name, after in watermarks.items():
+            # Raises when the server is unreachable, which counts as a failure
+            if await remote_db.has_updates(table_name, after):
+                return True
+        return False
+
+    def run_now(self) -> Future:
+        """Sync immediately on the scheduler thread; returns a Future with
+        perform_sync's result. Only valid while the scheduler runs."""
+        return asyncio.run_coroutine_threadsafe(self._cycle(force=True), self._loop)
+
+    async def sync_now(self) -> Dict[str, Any]:
+        """Manual sync from async code (API routes)."""
+        if self.running:
+            return await asyncio.wrap_future(self.run_now())
+        return await sync_engine.perform_sync()
+
+    def sync_now_blocking(self) -> Dict[str, Any]:
+        """Manual sync from a worker thread (desktop app)."""
+        if self.running:
+            return self.run_now().result()
+
+        async def once():
+            try:
+                return await sync_engine.perform_sync()
+            finally:
+                await remote_db.close()
+
+        return asyncio.run(once())
+
+    def status(self) -> Dict[str, Any]:
+        with local_db.get_session(readonly=True) as session:
+            depth = queue_depth(session)
+        return {
+            "next_run_at": self.next_run_at,
+            "last_run_at": self.last_run_at,
+            "last_result": self.last_result,
+            "consecutive_failures": self.failures,
+            "queue_depth": depth,
+        }
+
+
+sync_scheduler = SyncScheduler()
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_changes(session, flush_context):
+    if session.info.get(SKIP_NOTIFY_KEY):
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, SYNCED_MODELS):
+            session.info[_CHANGES_KEY] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_changes(orm_execute_state):
+    # insert(Patient)/update(...) statements, e.g. the bulk patient import
+    session = orm_execute_state.session
+    if session.info.get(SKIP_NOTIFY_KEY) or not (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        return
+    if orm_execute_state.statement.table in _SYNCED_TABLES:
+        session.info[_CHANGES_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_scheduler(session):
+    if session.info.pop(_CHANGES_KEY, False):
+        sync_scheduler.notify_change()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes(session):
+    session.info.pop(_CHANGES_KEY, None)
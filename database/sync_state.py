@@ -0,0 +1,91 @@
+"""Per table download positions (the sync_state table).
+
+Every download starts from one primary-key lookup per table instead of
+scanning the synced tables: the server's (updated_at, id) of the last
+remote row applied locally. It is written in the same transaction as the
+page it belongs to, so an interrupted download resumes where it stopped.
+Uploads are driven by the outbox (database.outbox).
+
+updated_at is the server's ordering key: the remote triggers in
+database/supabase_sync.sql set it from the server clock on every write,
+and clients never upload it. A device that edits offline and uploads
+hours later still gets new positions, above every other device's
+watermark. Those stamps are taken before the writing transaction
+commits, so a download starts ``sync_download_overlap_seconds`` before
+the watermark; a row committed just after a download, with a stamp
+just below its watermark, is picked up by the next one.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import Appointment, Clinic, Patient, SyncState
+
+logger = logging.getLogger(__name__)
+
+SYNCED_MODELS = (Clinic, Patient, Appointment)
+
+# Set by the server on every write, never uploaded (see above)
+SERVER_ORDERING_COLUMN = "updated_at"
+
+
+def get_sync_state(session: Session, table_name: str) -> SyncState:
+    state = session.get(SyncState, table_name)
+    if state is None:
+        state = SyncState(table_name=table_name)
+        session.add(state)
+    return state
+
+
+def download_watermark(
+    state: Optional[SyncState], overlap_seconds: float = 0
+) -> Optional[Tuple[str, str]]:
+    """Keyset to download after; with ``overlap_seconds``, moved back by
+    that much so rows committed late are fetched again."""
+    if state is None or not state.remote_updated_at:
+        return None
+    if overlap_seconds > 0:
+        try:
+            updated_at = datetime.fromisoformat(state.remote_updated_at)
+        except ValueError:
+            logger.warning(f"Unparsable watermark {state.remote_updated_at!r}")
+        else:
+            return ((updated_at - timedelta(seconds=overlap_seconds)).isoformat(), "")
+    return (state.remote_updated_at, state.remote_id or "")
+
+
+def set_download_watermark(state: SyncState, last_row: Dict[str, Any]) -> None:
+    state.remote_updated_at = str(last_row["updated_at"])
+    state.remote_id = str(last_row["id"])
+
+
+def seed_sync_state(conn) -> None:
+    """Create missing sync_state rows.
+
+    Databases synced before sync_state existed start downloading from the
+    newest local last_synced_at, the estimate sync used to recompute on
+    every cycle; this scan happens once per table.
+    """
+    existing = set(conn.execute(select(SyncState.table_name)).scalars())
+    for model in SYNCED_MODELS:
+        table_name = model.__tablename__
+        if table_name in existing:
+            continue
+
+        last_synced = conn.execute(select(func.max(model.last_synced_at))).scalar()
+        conn.execute(
+            sqlite_insert(SyncState)
+            .values(
+                table_name=table_name,
+                remote_updated_at=last_synced.isoformat() if last_synced else None,
+                remote_id="" if last_synced else None,
+                updated_at=datetime.utcnow(),
+            )
+            .on_conflict_do_nothing()
+        )
+        logger.info(f"Initialized sync state for {table_name}")
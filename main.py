@@ -5,6 +5,7 @@ from PySide6.QtWidgets import QApplication
 from app.ui.main_window import MainWindow
 from app.config import settings
 from app.database.local_db import local_db
+from app.database.sync_scheduler import sync_scheduler
 from app.services.clinic_service import ClinicService
 
 logging.basicConfig(
@@ -29,6 +30,10 @@ def main():
         clinic_id = clinic.id
     logger.info("Using clinic_id: %s", clinic_id)
 
+    local_db.start_maintenance()
+    # Automatic sync: after local changes and every sync_interval_minutes
+    sync_scheduler.start()
+
     app = QApplication(sys.argv)
     app.setApplicationName(settings.app_name)
     app.setApplicationVersion(settings.app_version)
@@ -0,0 +1,87 @@
+"""Commit throughput of the SQLite pragma profiles.
+
+Run from the directory that contains the app package:
+
+    python -m app.scripts.bench_sqlite_profiles [--commits 2000] [--dir PATH]
+
+Each profile gets a fresh database in ``--dir`` (a temporary directory by
+default; pass a directory on the disk the app will use, fsync cost depends
+on it) and creates patients one commit at a time, as the desktop forms do
+(``service``), then commits single-row inserts into a scratch table on the
+writer connection (``raw``, the pragma cost without the ORM's).
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+# name -> settings overrides; "legacy" is SQLite's defaults (plus WAL)
+PROFILES = {
+    "legacy": {
+        "sqlite_synchronous": "FULL",
+        "sqlite_cache_size_kb": 2000,
+        "sqlite_mmap_size": 0,
+        "sqlite_temp_store": "DEFAULT",
+    },
+    "default": {},
+    "full": {"sqlite_synchronous": "FULL"},
+    "off": {"sqlite_synchronous": "OFF"},
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commits", type=int, default=2000)
+    parser.add_argument("--dir", default=None)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp(dir=args.dir)
+
+    # Settings are read at import time: keep the app's database untouched
+    os.environ["LOCAL_DB_PATH"] = os.path.join(directory, "unused.db")
+    from app.config import settings
+    from app.database.local_db import LocalDatabase
+    from app.database.models import Clinic
+    from app.services.patient_service import PatientService
+
+    defaults = {name: getattr(settings, name) for name in PROFILES["legacy"]}
+    print(f"{args.commits} single-patient commits in {directory}")
+    print(f"{'profile':>8} {'synchronous':>11} {'service/s':>10} {'raw/s':>10}")
+    for profile, overrides in PROFILES.items():
+        for name, value in {**defaults, **overrides}.items():
+            setattr(settings, name, value)
+        db = LocalDatabase(db_path=os.path.join(directory, f"{profile}.db"))
+        with db.get_session() as session:
+            clinic = Clinic(name="Bench clinic")
+            session.add(clinic)
+            session.flush()
+            clinic_id = clinic.id
+
+        started = time.perf_counter()
+        for i in range(args.commits):
+            with db.get_session() as session:
+                PatientService(session).create_patient(
+                    clinic_id=clinic_id,
+                    national_id=f"{i:010d}",
+                    first_name="علی",
+                    last_name=f"رضایی {i}",
+                )
+        service = args.commits / (time.perf_counter() - started)
+
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("CREATE TABLE bench (value TEXT)")
+            conn.commit()
+            started = time.perf_counter()
+            for i in range(args.commits):
+                conn.exec_driver_sql("INSERT INTO bench VALUES (?)", (str(i),))
+                conn.commit()
+            raw = args.commits / (time.perf_counter() - started)
+        db.close()
+        print(
+            f"{profile:>8} {settings.sqlite_synchronous:>11} "
+            f"{service:>10.0f} {raw:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Upload throughput by sync batch size, against a local stand-in server.
+
+Run from the directory that contains the app package:
+
+    python -m app.scripts.bench_sync_upload [--rows 5000] [--latency 0.02]
+
+The stand-in accepts PostgREST bulk upserts on a local port and answers
+each request after ``--latency`` seconds, like a round trip to Supabase.
+A throwaway database is used; the app's own database is not touched.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BATCH_SIZES = [1, 10, 50, 100, 500, 1000]
+
+
+class StandIn(BaseHTTPRequestHandler):
+    latency = 0.0
+    rows = 0
+
+    def _reply(self, status: int, body: bytes = b"") -> None:
+        time.sleep(self.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply(200, b"[]")
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        StandIn.rows += len(body)
+        self._reply(201)
+
+    def log_message(self, *args):
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    StandIn.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Settings are read at import time
+    os.environ["LOCAL_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["SUPABASE_ANON_KEY"] = "bench"
+    from app.config import settings
+    from app.database.local_db import local_db
+    from app.database.models import Clinic
+    from app.database.remote_db import remote_db
+    from app.database.sync import sync_engine
+    from app.services.patient_service import PatientService
+
+    with local_db.get_session() as session:
+        clinic = Clinic(name="Bench clinic")
+        session.add(clinic)
+        session.flush()
+        PatientService(session).import_patients(
+            clinic.id,
+            (
+                (
+                    i,
+                    {
+                        "national_id": f"{i:010d}",
+                        "first_name": "علی",
+                        "last_name": f"رضایی {i}",
+                        "mobile": f"0912{i:07d}",
+                    },
+                )
+                for i in range(args.rows)
+            ),
+        )
+
+    async def upload() -> bool:
+        try:
+            return await sync_engine.sync_to_remote()
+        finally:
+            await remote_db.close()
+
+    print(
+        f"{args.rows} new patients, {args.latency * 1000:.0f} ms per request, "
+        f"{settings.remote_max_concurrency} concurrent requests"
+    )
+    print(f"{'batch':>6} {'requests':>9} {'seconds':>8} {'rows/s':>8}")
+    for batch_size in BATCH_SIZES:
+        # Queue every patient again as a whole-row upload
+        with local_db.engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM sync_outbox")
+            conn.exec_driver_sql(
+                "INSERT INTO sync_outbox (entity_type, entity_id, operation, "
+                "version, created_at, updated_at) SELECT 'patients', id, 'upsert', "
+                "1, datetime('now'), datetime('now') FROM patients"
+            )
+        sync_engine.batch_size = batch_size
+        StandIn.rows = 0
+        started = time.perf_counter()
+        ok = asyncio.run(upload())
+        elapsed = time.perf_counter() - started
+        assert ok and StandIn.rows == args.rows, (ok, StandIn.rows)
+        requests = -(-args.rows // batch_size)
+        print(
+            f"{batch_size:>6} {requests:>9} {elapsed:>8.2f} "
+            f"{args.rows / elapsed:>8.0f}"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
-from .patient_service import PatientService
-from .appointment_service import AppointmentService
-from .report_service import ReportService
+from .patient_service import PatientService, AsyncPatientService
+from .appointment_service import AppointmentService, AsyncAppointmentService
+from .report_service import ReportService, AsyncReportService
 from .clinic_service import ClinicService
 from .sms_service import sms_service, SMSService
+from .sync_log_service import SyncLogService
 
 __all__ = [
     "PatientService",
     "AppointmentService",
     "ReportService",
+    "AsyncPatientService",
+    "AsyncAppointmentService",
+    "AsyncReportService",
     "ClinicService",
     "SMSService",
     "sms_service",
+    "SyncLogService",
 ]
@@ -1,15 +1,54 @@
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional, Sequence, Tuple
 from datetime import datetime, date, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query, Session, joinedload, selectinload
+from sqlalchemy import func
 
 from app.database.models import Appointment, Patient
+from app.database.rollup import refresh_rollup_days
+from .pagination import keyset_chunk, keyset_page
+from .report_service import invalidate_clinic_stats
+
+
+# How read paths load Appointment.patient:
+#   "selectin" - one extra IN query for all patients of the result (default)
+#   "joined"   - LEFT OUTER JOIN in the same query
+#   "lazy"     - no eager loading (one query per row on access, avoid in lists)
+PatientLoading = Literal["selectin", "joined", "lazy"]
+
+
+def with_patient(query: Query, load: PatientLoading = "selectin") -> Query:
+    if load == "selectin":
+        return query.options(selectinload(Appointment.patient))
+    if load == "joined":
+        return query.options(joinedload(Appointment.patient))
+    return query
 
 
 class AppointmentService:
     def __init__(self, db: Session):
         self.db = db
 
+    def _appointments(
+        self, load: PatientLoading, columns: Optional[Sequence] = None
+    ) -> Query:
+        """Appointment query; with ``columns``, rows of just those columns
+        (Patient columns allowed, through an outer join) instead of
+        Appointment objects, for lean list responses."""
+        if columns:
+            return (
+                self.db.query(*columns)
+                .select_from(Appointment)
+                .outerjoin(Appointment.patient)
+            )
+        return with_patient(self.db.query(Appointment), load)
+
+    def _refresh_rollup(self, *day_keys) -> None:
+        """Recompute the revenue rollup for (clinic_id, date) pairs, in the
+        current transaction."""
+        self.db.flush()
+        refresh_rollup_days(self.db, day_keys)
+
     def create_appointment(
         self,
         clinic_id: str,
@@ -24,13 +63,17 @@ class AppointmentService:
             **kwargs,
         )
         self.db.add(appointment)
+        self._refresh_rollup((clinic_id, appointment_date))
         self.db.commit()
         self.db.refresh(appointment)
+        invalidate_clinic_stats(clinic_id)
         return appointment
 
-    def get_appointment(self, appointment_id: str) -> Optional[Appointment]:
+    def get_appointment(
+        self, appointment_id: str, load: PatientLoading = "joined"
+    ) -> Optional[Appointment]:
         return (
-            self.db.query(Appointment)
+            with_patient(self.db.query(Appointment), load)
             .filter(
                 Appointment.id == appointment_id,
                 Appointment.deleted_at.is_(None),
@@ -39,13 +82,17 @@ class AppointmentService:
         )
 
     def get_appointments_by_date(
-        self, clinic_id: str, target_date: date
+        self,
+        clinic_id: str,
+        target_date: date,
+        load: PatientLoading = "selectin",
+        columns: Optional[Sequence] = None,
     ) -> List[Appointment]:
         start_of_day = datetime.combine(target_date, datetime.min.time())
         end_of_day = datetime.combine(target_date, datetime.max.time())
 
         return (
-            self.db.query(Appointment)
+            self._appointments(load, columns)
             .filter(
                 Appointment.clinic_id == clinic_id,
                 Appointment.deleted_at.is_(None),
@@ -56,29 +103,87 @@ class AppointmentService:
             .all()
         )
 
+    def get_appointments_chunk(
+        self,
+        clinic_id: str,
+        columns: Sequence,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        after: Optional[Tuple] = None,
+        chunk_size: int = 1000,
+    ) -> Tuple[List[Tuple], Optional[Tuple]]:
+        """One keyset chunk of a clinic's appointments in [start, end) by
+        date, as rows of ``columns`` (exports, see keyset_chunk)."""
+        query = self._appointments("lazy", columns).filter(
+            Appointment.clinic_id == clinic_id,
+            Appointment.deleted_at.is_(None),
+        )
+        if start is not None:
+            query = query.filter(Appointment.appointment_date >= start)
+        if end is not None:
+            query = query.filter(Appointment.appointment_date < end)
+        return keyset_chunk(
+            query, (Appointment.appointment_date, Appointment.id), chunk_size, after
+        )
+
     def get_patient_appointments(
-        self, patient_id: str, skip: int = 0, limit: int = 50
+        self,
+        patient_id: str,
+        skip: int = 0,
+        limit: int = 50,
+        load: PatientLoading = "selectin",
     ) -> List[Appointment]:
         return (
-            self.db.query(Appointment)
+            with_patient(self.db.query(Appointment), load)
             .filter(
                 Appointment.patient_id == patient_id,
                 Appointment.deleted_at.is_(None),
             )
-            .order_by(Appointment.appointment_date.desc())
+            .order_by(Appointment.appointment_date.desc(), Appointment.id.desc())
             .offset(skip)
             .limit(limit)
             .all()
         )
 
+    def get_patient_appointments_page(
+        self,
+        patient_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+        load: PatientLoading = "selectin",
+        columns: Optional[Sequence] = None,
+    ) -> Dict:
+        """A patient's visits, newest first by (appointment_date, id), one
+        page at a time (see services.pagination.keyset_page). ``columns``,
+        when given, must include the sort key."""
+        filters = (
+            Appointment.patient_id == patient_id,
+            Appointment.deleted_at.is_(None),
+        )
+        return keyset_page(
+            self._appointments(load, columns).filter(*filters),
+            (Appointment.appointment_date, Appointment.id),
+            limit,
+            cursor,
+            count_query=(
+                self.db.query(Appointment).filter(*filters) if include_total else None
+            ),
+            descending=True,
+        )
+
     def get_upcoming_appointments(
-        self, clinic_id: str, days: int = 7
+        self,
+        clinic_id: str,
+        days: int = 7,
+        load: PatientLoading = "selectin",
+        columns: Optional[Sequence] = None,
     ) -> List[Appointment]:
         now = datetime.utcnow()
         future = now + timedelta(days=days)
 
         return (
-            self.db.query(Appointment)
+            self._appointments(load, columns)
             .filter(
                 Appointment.clinic_id == clinic_id,
                 Appointment.deleted_at.is_(None),
@@ -93,36 +198,45 @@ class AppointmentService:
     def update_appointment(
         self, appointment_id: str, **kwargs
     ) -> Optional[Appointment]:
-        appointment = self.get_appointment(appointment_id)
+        appointment = self.get_appointment(appointment_id, load="lazy")
         if not appointment:
             return None
 
+        old_day_key = (appointment.clinic_id, appointment.appointment_date)
         for key, value in kwargs.items():
             if hasattr(appointment, key):
                 setattr(appointment, key, value)
 
         appointment.updated_at = datetime.utcnow()
         appointment.sync_status = "pending"
+        self._refresh_rollup(
+            old_day_key, (appointment.clinic_id, appointment.appointment_date)
+        )
         self.db.commit()
         self.db.refresh(appointment)
+        invalidate_clinic_stats(appointment.clinic_id)
         return appointment
 
     def cancel_appointment(self, appointment_id: str) -> bool:
-        appointment = self.get_appointment(appointment_id)
+        appointment = self.get_appointment(appointment_id, load="lazy")
         if not appointment:
             return False
 
         appointment.status = "cancelled"
         appointment.updated_at = datetime.utcnow()
         appointment.sync_status = "pending"
+        clinic_id = appointment.clinic_id
+        self._refresh_rollup((clinic_id, appointment.appointment_date))
         self.db.commit()
+        invalidate_clinic_stats(clinic_id)
         return True
 
     def complete_appointment(self, appointment_id: str, **kwargs) -> bool:
-        appointment = self.get_appointment(appointment_id)
+        appointment = self.get_appointment(appointment_id, load="lazy")
         if not appointment:
             return False
 
+        old_day_key = (appointment.clinic_id, appointment.appointment_date)
         appointment.status = "completed"
         for key, value in kwargs.items():
             if hasattr(appointment, key):
@@ -130,17 +244,23 @@ class AppointmentService:
 
         appointment.updated_at = datetime.utcnow()
         appointment.sync_status = "pending"
+        clinic_id = appointment.clinic_id
+        self._refresh_rollup(old_day_key, (clinic_id, appointment.appointment_date))
         self.db.commit()
+        invalidate_clinic_stats(clinic_id)
         return True
 
     def delete_appointment(self, appointment_id: str) -> bool:
-        appointment = self.get_appointment(appointment_id)
+        appointment = self.get_appointment(appointment_id, load="lazy")
         if not appointment:
             return False
 
         appointment.deleted_at = datetime.utcnow()
         appointment.sync_status = "pending"
+        clinic_id = appointment.clinic_id
+        self._refresh_rollup((clinic_id, appointment.appointment_date))
         self.db.commit()
+        invalidate_clinic_stats(clinic_id)
         return True
 
     def check_availability(
@@ -165,3 +285,61 @@ class AppointmentService:
         )
 
         return conflicting is None
+
+
+class AsyncAppointmentService:
+    """AppointmentService read methods on an AsyncSession (async API path).
+
+    The queries are AppointmentService's own, run with AsyncSession.run_sync;
+    Appointment.patient must be eager loaded (not "lazy") as lazy loads are
+    not possible outside run_sync.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_appointments_by_date(
+        self,
+        clinic_id: str,
+        target_date: date,
+        load: PatientLoading = "selectin",
+        columns: Optional[Sequence] = None,
+    ) -> List[Appointment]:
+        return await self.db.run_sync(
+            lambda db: AppointmentService(db).get_appointments_by_date(
+                clinic_id, target_date, load, columns
+            )
+        )
+
+    async def get_patient_appointments_page(
+        self,
+        patient_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+        load: PatientLoading = "selectin",
+        columns: Optional[Sequence] = None,
+    ) -> Dict:
+        return await self.db.run_sync(
+            lambda db: AppointmentService(db).get_patient_appointments_page(
+                patient_id,
+                limit=limit,
+                cursor=cursor,
+                include_total=include_total,
+                load=load,
+                columns=columns,
+            )
+        )
+
+    async def get_upcoming_appointments(
+        self,
+        clinic_id: str,
+        days: int = 7,
+        load: PatientLoading = "selectin",
+        columns: Optional[Sequence] = None,
+    ) -> List[Appointment]:
+        return await self.db.run_sync(
+            lambda db: AppointmentService(db).get_upcoming_appointments(
+                clinic_id, days, load, columns
+            )
+        )
@@ -0,0 +1,115 @@
+"""Keyset pagination with opaque cursors.
+
+A cursor is the sort key of the last row of a page, JSON encoded and then
+base64url'd so clients treat it as an opaque token. Exports read in keyset
+chunks too (keyset_chunk), keeping the sort key as plain values.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, tuple_
+from sqlalchemy.orm import Query
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decode a cursor into its ``size`` sort-key values.
+
+    Raises ValueError for malformed or foreign cursors.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def decode_datetime(value: Any) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _after(query: Query, sort_key: Sequence, last: Sequence, descending: bool) -> Query:
+    key = tuple_(*sort_key)
+    return query.filter(key < tuple(last) if descending else key > tuple(last))
+
+
+def _ordered(query: Query, sort_key: Sequence, descending: bool) -> Query:
+    return query.order_by(
+        *([column.desc() for column in sort_key] if descending else sort_key)
+    )
+
+
+def keyset_page(
+    query: Query,
+    sort_key: Sequence,
+    limit: int,
+    cursor: Optional[str] = None,
+    count_query: Optional[Query] = None,
+    descending: bool = False,
+) -> Dict:
+    """One page of ``query`` ordered by the ``sort_key`` columns, starting
+    after ``cursor``.
+
+    Returns ``{"items", "next_cursor", "total"}``. Items (objects or
+    column rows) must have the sort key columns as attributes; ``total``
+    is ``count_query.count()``, None without a count query. Raises
+    ValueError for an invalid cursor.
+    """
+    if cursor:
+        last = [
+            decode_datetime(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(sort_key, decode_cursor(cursor, len(sort_key)))
+        ]
+        query = _after(query, sort_key, last, descending)
+
+    rows = _ordered(query, sort_key, descending).limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(
+            [getattr(items[-1], column.key) for column in sort_key]
+        )
+
+    total = count_query.count() if count_query is not None else None
+    return {"items": items, "next_cursor": next_cursor, "total": total}
+
+
+def keyset_chunk(
+    query: Query,
+    sort_key: Sequence,
+    limit: int,
+    after: Optional[Tuple] = None,
+    descending: bool = False,
+) -> Tuple[List[Tuple], Optional[Tuple]]:
+    """Up to ``limit`` rows of a column query ordered by ``sort_key``,
+    starting after the sort key values ``after``.
+
+    Returns the rows (tuples of the query's columns) and the sort key to
+    pass as ``after`` for the next chunk, None after the last one. The sort
+    key is selected alongside the columns, so they need not include it.
+    """
+    width = len(query.column_descriptions)
+    query = query.add_columns(
+        *(column.label(f"keyset_{i}") for i, column in enumerate(sort_key))
+    )
+    if after is not None:
+        query = _after(query, sort_key, after, descending)
+
+    rows = _ordered(query, sort_key, descending).limit(limit + 1).all()
+    chunk = [tuple(row[:width]) for row in rows[:limit]]
+    next_after = tuple(rows[limit - 1][width:]) if len(rows) > limit else None
+    return chunk, next_after
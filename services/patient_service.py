@@ -1,9 +1,24 @@
-from typing import List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import insert, literal_column, or_, text
+from sqlalchemy.exc import IntegrityError
 
-from app.database.models import Patient
+from app.database.models import Patient, generate_uuid
+from app.database.patient_search import (
+    MIN_FTS_TERM_LENGTH,
+    apply_patient_search_keys,
+    build_match_expression,
+    has_patient_fts,
+    normalize_search_query,
+    patient_search_keys,
+    patients_fts,
+)
+from .pagination import keyset_chunk, keyset_page
+from .report_service import invalidate_clinic_stats
+
+IMPORT_BATCH_SIZE = 1000
 
 
 class PatientService:
@@ -25,11 +40,123 @@ class PatientService:
             last_name=last_name,
             **kwargs,
         )
+        apply_patient_search_keys(patient)
         self.db.add(patient)
         self.db.commit()
         self.db.refresh(patient)
+        invalidate_clinic_stats(clinic_id)
         return patient
 
+    def import_patients(
+        self,
+        clinic_id: str,
+        rows: Iterable[Tuple[int, Dict[str, Any]]],
+        batch_size: int = IMPORT_BATCH_SIZE,
+    ) -> Dict:
+        """Insert many patients in batched transactions.
+
+        ``rows`` yields ``(row_number, fields)`` pairs with already validated
+        fields. Rows whose national_id already exists (in the database or
+        earlier in the same import) are reported as conflicts and skipped;
+        the rest of the batch is still inserted.
+        """
+        report = {"imported": 0, "conflicts": [], "errors": []}
+        seen_national_ids = set()
+        batch = []
+
+        for row_number, fields in rows:
+            batch.append((row_number, fields))
+            if len(batch) >= batch_size:
+                self._import_batch(clinic_id, batch, seen_national_ids, report)
+                batch = []
+
+        if batch:
+            self._import_batch(clinic_id, batch, seen_national_ids, report)
+
+        invalidate_clinic_stats(clinic_id)
+        return report
+
+    def _import_batch(
+        self,
+        clinic_id: str,
+        batch: List[Tuple[int, Dict[str, Any]]],
+        seen_national_ids: set,
+        report: Dict,
+    ) -> None:
+        national_ids = [fields["national_id"] for _, fields in batch]
+        existing = {
+            row[0]
+            for row in self.db.query(Patient.national_id).filter(
+                Patient.national_id.in_(national_ids)
+            )
+        }
+
+        now = datetime.utcnow()
+        values = []
+        for row_number, fields in batch:
+            national_id = fields["national_id"]
+            if national_id in existing or national_id in seen_national_ids:
+                report["conflicts"].append(
+                    {
+                        "row": row_number,
+                        "national_id": national_id,
+                        "detail": "کد ملی تکراری است",
+                    }
+                )
+                continue
+            seen_national_ids.add(national_id)
+            values.append(
+                (
+                    row_number,
+                    {
+                        **fields,
+                        **patient_search_keys(
+                            fields.get("first_name"),
+                            fields.get("last_name"),
+                            national_id,
+                            fields.get("phone"),
+                            fields.get("mobile"),
+                        ),
+                        "id": generate_uuid(),
+                        "clinic_id": clinic_id,
+                        "created_at": now,
+                        "updated_at": now,
+                        "sync_status": "pending",
+                    },
+                )
+            )
+
+        if not values:
+            return
+
+        try:
+            self.db.execute(insert(Patient), [row for _, row in values])
+            self.db.commit()
+            report["imported"] += len(values)
+        except IntegrityError:
+            # Something slipped past the pre-check (e.g. a concurrent write);
+            # fall back to row-by-row so only the offending rows are dropped.
+            self.db.rollback()
+            self._import_rows_individually(values, report)
+
+    def _import_rows_individually(
+        self, values: List[Tuple[int, Dict[str, Any]]], report: Dict
+    ) -> None:
+        for row_number, row in values:
+            try:
+                with self.db.begin_nested():
+                    self.db.execute(insert(Patient), [row])
+                report["imported"] += 1
+            except IntegrityError as e:
+                report["errors"].append(
+                    {
+                        "row": row_number,
+                        "national_id": row["national_id"],
+                        "detail": str(e.orig),
+                    }
+                )
+        self.db.commit()
+
     def get_patient(self, patient_id: str) -> Optional[Patient]:
         return (
             self.db.query(Patient)
@@ -46,32 +173,133 @@ class PatientService:
             .first()
         )
 
+    def _active_patients(self, clinic_id: str, columns: Optional[Sequence] = None):
+        """Active patients of a clinic; with ``columns``, rows of just those
+        columns instead of Patient objects (for lean list responses)."""
+        return self.db.query(*(columns or (Patient,))).filter(
+            Patient.clinic_id == clinic_id, Patient.deleted_at.is_(None)
+        )
+
     def get_patients(
-        self, clinic_id: str, skip: int = 0, limit: int = 100
+        self,
+        clinic_id: str,
+        skip: int = 0,
+        limit: int = 100,
+        columns: Optional[Sequence] = None,
     ) -> List[Patient]:
         return (
-            self.db.query(Patient)
-            .filter(Patient.clinic_id == clinic_id, Patient.deleted_at.is_(None))
+            self._active_patients(clinic_id, columns)
+            .order_by(Patient.last_name, Patient.first_name, Patient.id)
             .offset(skip)
             .limit(limit)
             .all()
         )
 
-    def search_patients(self, clinic_id: str, query: str) -> List[Patient]:
-        search_term = f"%{query}%"
+    def get_patients_page(
+        self,
+        clinic_id: str,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+        columns: Optional[Sequence] = None,
+    ) -> Dict:
+        """Patients by (last_name, first_name, id), one page at a time (see
+        services.pagination.keyset_page). ``columns``, when given, must
+        include the sort key."""
+        return keyset_page(
+            self._active_patients(clinic_id, columns),
+            (Patient.last_name, Patient.first_name, Patient.id),
+            limit,
+            cursor,
+            count_query=self._active_patients(clinic_id) if include_total else None,
+        )
+
+    def get_patients_chunk(
+        self,
+        clinic_id: str,
+        columns: Sequence,
+        after: Optional[Tuple] = None,
+        chunk_size: int = 1000,
+    ) -> Tuple[List[Tuple], Optional[Tuple]]:
+        """One keyset chunk of a clinic's active patients in list order, as
+        rows of ``columns`` (exports, see keyset_chunk)."""
+        return keyset_chunk(
+            self._active_patients(clinic_id, columns),
+            (Patient.last_name, Patient.first_name, Patient.id),
+            chunk_size,
+            after,
+        )
+
+    def search_patients(
+        self, clinic_id: str, query: str, limit: int = 50
+    ) -> List[Patient]:
+        normalized = normalize_search_query(query)
+        if not normalized:
+            return []
+
+        match = build_match_expression(normalized)
+        if match is not None and has_patient_fts(self.db):
+            return self._search_patients_fts(clinic_id, match, limit)
+        if len(normalized) < MIN_FTS_TERM_LENGTH:
+            return self._search_patients_prefix(clinic_id, normalized, limit)
+        return self._search_patients_like(clinic_id, normalized, limit)
+
+    def _search_patients_fts(
+        self, clinic_id: str, match: str, limit: int
+    ) -> List[Patient]:
+        return (
+            self.db.query(Patient)
+            .join(patients_fts, patients_fts.c.rowid == literal_column("patients.rowid"))
+            .filter(
+                text("patients_fts MATCH :match").bindparams(match=match),
+                Patient.clinic_id == clinic_id,
+                Patient.deleted_at.is_(None),
+            )
+            .order_by(patients_fts.c.rank)
+            .limit(limit)
+            .all()
+        )
+
+    def _search_patients_prefix(
+        self, clinic_id: str, prefix: str, limit: int
+    ) -> List[Patient]:
+        # One range query per name index: an OR of both ranges would only
+        # use the clinic_id part of an index and scan the clinic's patients
+        upper = prefix + "\uffff"
+        patients: Dict[str, Patient] = {}
+        for search_column in (Patient.search_first_name, Patient.search_last_name):
+            matches = (
+                self.db.query(Patient)
+                .filter(
+                    Patient.clinic_id == clinic_id,
+                    Patient.deleted_at.is_(None),
+                    search_column >= prefix,
+                    search_column < upper,
+                )
+                .order_by(search_column)
+                .limit(limit)
+                .all()
+            )
+            for patient in matches:
+                patients.setdefault(patient.id, patient)
+        return list(patients.values())[:limit]
+
+    def _search_patients_like(
+        self, clinic_id: str, normalized: str, limit: int
+    ) -> List[Patient]:
+        search_term = f"%{normalized}%"
         return (
             self.db.query(Patient)
             .filter(
                 Patient.clinic_id == clinic_id,
                 Patient.deleted_at.is_(None),
                 or_(
-                    Patient.first_name.ilike(search_term),
-                    Patient.last_name.ilike(search_term),
-                    Patient.national_id.ilike(search_term),
-                    Patient.phone.ilike(search_term),
-                    Patient.mobile.ilike(search_term),
+                    Patient.search_first_name.like(search_term),
+                    Patient.search_last_name.like(search_term),
+                    Patient.search_contact.like(search_term),
                 ),
             )
+            .limit(limit)
             .all()
         )
 
@@ -84,6 +312,7 @@ class PatientService:
             if hasattr(patient, key):
                 setattr(patient, key, value)
 
+        apply_patient_search_keys(patient)
         patient.updated_at = datetime.utcnow()
         patient.sync_status = "pending"
         self.db.commit()
@@ -97,7 +326,9 @@ class PatientService:
 
         patient.deleted_at = datetime.utcnow()
         patient.sync_status = "pending"
+        clinic_id = patient.clinic_id
         self.db.commit()
+        invalidate_clinic_stats(clinic_id)
         return True
 
     def get_patient_stats(self, clinic_id: str) -> dict:
@@ -108,3 +339,49 @@ class PatientService:
         )
 
         return {"total_patients": total_patients}
+
+
+class AsyncPatientService:
+    """PatientService read methods on an AsyncSession (async API path).
+
+    The queries are PatientService's own, run with AsyncSession.run_sync.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_patients(
+        self,
+        clinic_id: str,
+        skip: int = 0,
+        limit: int = 100,
+        columns: Optional[Sequence] = None,
+    ) -> List[Patient]:
+        return await self.db.run_sync(
+            lambda db: PatientService(db).get_patients(clinic_id, skip, limit, columns)
+        )
+
+    async def get_patients_page(
+        self,
+        clinic_id: str,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+        columns: Optional[Sequence] = None,
+    ) -> Dict:
+        return await self.db.run_sync(
+            lambda db: PatientService(db).get_patients_page(
+                clinic_id,
+                limit=limit,
+                cursor=cursor,
+                include_total=include_total,
+                columns=columns,
+            )
+        )
+
+    async def search_patients(
+        self, clinic_id: str, query: str, limit: int = 50
+    ) -> List[Patient]:
+        return await self.db.run_sync(
+            lambda db: PatientService(db).search_patients(clinic_id, query, limit)
+        )
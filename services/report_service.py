@@ -1,53 +1,110 @@
-from typing import Dict, List
+from typing import Dict, List, Optional, Sequence, Tuple
 from datetime import datetime, date, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy import func
+import threading
+import time
 
-from app.database.models import Appointment, Patient
+from app.config import settings
+from app.database.models import Appointment, DailyRevenueRollup, Patient
+from .pagination import keyset_chunk
+
+
+class _StatsCache:
+    """Short-TTL, per-clinic cache for get_clinic_stats (0 TTL disables).
+
+    Entries are keyed on the change version they were computed at, when
+    the caller knows it: writes by other processes (sync, a second app
+    instance) do not invalidate this cache, but they do bump the version.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, date, Optional[int], Dict]] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, clinic_id: str, today: date, version: Optional[int] = None
+    ) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(clinic_id)
+        if entry is None:
+            return None
+        expires_at, cached_day, cached_version, stats = entry
+        # Day rollover changes today/upcoming counts, so never serve across it
+        if cached_day != today or time.monotonic() >= expires_at:
+            return None
+        if cached_version != version:
+            return None
+        return dict(stats)
+
+    def put(
+        self, clinic_id: str, today: date, stats: Dict, version: Optional[int] = None
+    ) -> None:
+        ttl = settings.report_stats_cache_seconds
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[clinic_id] = (
+                time.monotonic() + ttl,
+                today,
+                version,
+                dict(stats),
+            )
+
+    def invalidate(self, clinic_id: Optional[str] = None) -> None:
+        with self._lock:
+            if clinic_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(clinic_id, None)
+
+
+_stats_cache = _StatsCache()
+
+
+def invalidate_clinic_stats(clinic_id: Optional[str] = None) -> None:
+    """Drop cached clinic stats after patient/appointment writes."""
+    _stats_cache.invalidate(clinic_id)
 
 
 class ReportService:
     def __init__(self, db: Session):
         self.db = db
 
-    def get_daily_revenue(self, clinic_id: str, target_date: date = None) -> Dict:
-        if not target_date:
-            target_date = date.today()
-
-        start_of_day = datetime.combine(target_date, datetime.min.time())
-        end_of_day = datetime.combine(target_date, datetime.max.time())
-
-        appointments = (
-            self.db.query(Appointment)
+    def _rollup_days(self, clinic_id: str, start: date, end: date):
+        """Rollup rows for days in [start, end), oldest first."""
+        return (
+            self.db.query(DailyRevenueRollup)
             .filter(
-                Appointment.clinic_id == clinic_id,
-                Appointment.deleted_at.is_(None),
-                Appointment.appointment_date >= start_of_day,
-                Appointment.appointment_date <= end_of_day,
+                DailyRevenueRollup.clinic_id == clinic_id,
+                DailyRevenueRollup.day >= start,
+                DailyRevenueRollup.day < end,
             )
+            .order_by(DailyRevenueRollup.day)
             .all()
         )
 
-        total_revenue = sum(
-            float(apt.visit_fee or 0) for apt in appointments
-        )
-        total_paid = sum(
-            float(apt.paid_amount or 0) for apt in appointments
+    def get_daily_revenue(self, clinic_id: str, target_date: date = None) -> Dict:
+        if not target_date:
+            target_date = date.today()
+
+        rows = self._rollup_days(
+            clinic_id, target_date, target_date + timedelta(days=1)
         )
-        total_pending = total_revenue - total_paid
+        row = rows[0] if rows else None
+
+        total_revenue = float(row.revenue) if row else 0.0
+        total_paid = float(row.paid) if row else 0.0
 
         return {
             "date": target_date.isoformat(),
-            "total_appointments": len(appointments),
-            "completed_appointments": len(
-                [a for a in appointments if a.status == "completed"]
-            ),
-            "cancelled_appointments": len(
-                [a for a in appointments if a.status == "cancelled"]
-            ),
+            "total_appointments": row.appointment_count if row else 0,
+            "completed_appointments": row.completed_count if row else 0,
+            "cancelled_appointments": row.cancelled_count if row else 0,
             "total_revenue": total_revenue,
             "total_paid": total_paid,
-            "total_pending": total_pending,
+            "total_pending": total_revenue - total_paid,
         }
 
     def get_monthly_revenue(
@@ -58,41 +115,29 @@ class ReportService:
         if not month:
             month = datetime.now().month
 
-        appointments = (
-            self.db.query(Appointment)
-            .filter(
-                Appointment.clinic_id == clinic_id,
-                Appointment.deleted_at.is_(None),
-                extract("year", Appointment.appointment_date) == year,
-                extract("month", Appointment.appointment_date) == month,
-            )
-            .all()
-        )
-
-        total_revenue = sum(
-            float(apt.visit_fee or 0) for apt in appointments
-        )
-        total_paid = sum(
-            float(apt.paid_amount or 0) for apt in appointments
-        )
+        start_of_month = date(year, month, 1)
+        if month == 12:
+            end_of_month = date(year + 1, 1, 1)
+        else:
+            end_of_month = date(year, month + 1, 1)
 
-        daily_breakdown = {}
-        for apt in appointments:
-            day = apt.appointment_date.date().isoformat()
-            if day not in daily_breakdown:
-                daily_breakdown[day] = {
-                    "appointments": 0,
-                    "revenue": 0,
-                    "paid": 0,
-                }
-            daily_breakdown[day]["appointments"] += 1
-            daily_breakdown[day]["revenue"] += float(apt.visit_fee or 0)
-            daily_breakdown[day]["paid"] += float(apt.paid_amount or 0)
+        daily_breakdown = {
+            row.day.isoformat(): {
+                "appointments": row.appointment_count,
+                "revenue": float(row.revenue),
+                "paid": float(row.paid),
+            }
+            for row in self._rollup_days(clinic_id, start_of_month, end_of_month)
+        }
+        total_revenue = sum(d["revenue"] for d in daily_breakdown.values())
+        total_paid = sum(d["paid"] for d in daily_breakdown.values())
 
         return {
             "year": year,
             "month": month,
-            "total_appointments": len(appointments),
+            "total_appointments": sum(
+                d["appointments"] for d in daily_breakdown.values()
+            ),
             "total_revenue": total_revenue,
             "total_paid": total_paid,
             "total_pending": total_revenue - total_paid,
@@ -134,49 +179,113 @@ class ReportService:
             ],
         }
 
-    def get_clinic_stats(self, clinic_id: str) -> Dict:
+    def get_patient_visits_chunk(
+        self,
+        patient_id: str,
+        columns: Sequence,
+        after: Optional[Tuple] = None,
+        chunk_size: int = 1000,
+    ) -> Tuple[List[Tuple], Optional[Tuple]]:
+        """One keyset chunk of a patient's visits, newest first, as rows of
+        ``columns`` (exports, see keyset_chunk)."""
+        return keyset_chunk(
+            self.db.query(*columns).filter(
+                Appointment.patient_id == patient_id,
+                Appointment.deleted_at.is_(None),
+            ),
+            (Appointment.appointment_date, Appointment.id),
+            chunk_size,
+            after,
+            descending=True,
+        )
+
+    def get_clinic_stats(
+        self, clinic_id: str, use_cache: bool = True, version: Optional[int] = None
+    ) -> Dict:
+        """Counts for the dashboard. ``version`` is the change version of
+        the patients and appointments tables the caller read (e.g. for an
+        ETag); a cached result is only served if computed at the same one.
+        """
+        today = date.today()
+        if use_cache:
+            cached = _stats_cache.get(clinic_id, today, version)
+            if cached is not None:
+                return cached
+
+        start_of_today = datetime.combine(today, datetime.min.time())
+        start_of_tomorrow = start_of_today + timedelta(days=1)
+        end_of_week = start_of_tomorrow + timedelta(days=7)
+
         total_patients = (
-            self.db.query(Patient)
+            self.db.query(func.count())
             .filter(Patient.clinic_id == clinic_id, Patient.deleted_at.is_(None))
-            .count()
+            .scalar_subquery()
         )
-
-        total_appointments = (
-            self.db.query(Appointment)
+        row = (
+            self.db.query(
+                total_patients.label("total_patients"),
+                func.count().label("total_appointments"),
+                func.count()
+                .filter(
+                    Appointment.appointment_date >= start_of_today,
+                    Appointment.appointment_date < start_of_tomorrow,
+                )
+                .label("today_appointments"),
+                func.count()
+                .filter(
+                    Appointment.status == "scheduled",
+                    Appointment.appointment_date >= start_of_tomorrow,
+                    Appointment.appointment_date < end_of_week,
+                )
+                .label("upcoming_appointments"),
+            )
             .filter(
                 Appointment.clinic_id == clinic_id,
                 Appointment.deleted_at.is_(None),
             )
-            .count()
+            .one()
         )
 
-        today = date.today()
-        today_appointments = (
-            self.db.query(Appointment)
-            .filter(
-                Appointment.clinic_id == clinic_id,
-                Appointment.deleted_at.is_(None),
-                func.date(Appointment.appointment_date) == today,
-            )
-            .count()
+        stats = {
+            "total_patients": row.total_patients,
+            "total_appointments": row.total_appointments,
+            "today_appointments": row.today_appointments,
+            "upcoming_appointments": row.upcoming_appointments,
+        }
+        if use_cache:
+            _stats_cache.put(clinic_id, today, stats, version)
+        return stats
+
+
+class AsyncReportService:
+    """ReportService on an AsyncSession (async API path).
+
+    The queries are ReportService's own, run with AsyncSession.run_sync.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_daily_revenue(self, clinic_id: str, target_date: date = None) -> Dict:
+        return await self.db.run_sync(
+            lambda db: ReportService(db).get_daily_revenue(clinic_id, target_date)
         )
 
-        upcoming_week = today + timedelta(days=7)
-        upcoming_appointments = (
-            self.db.query(Appointment)
-            .filter(
-                Appointment.clinic_id == clinic_id,
-                Appointment.deleted_at.is_(None),
-                Appointment.status == "scheduled",
-                func.date(Appointment.appointment_date) > today,
-                func.date(Appointment.appointment_date) <= upcoming_week,
-            )
-            .count()
+    async def get_monthly_revenue(
+        self, clinic_id: str, year: int = None, month: int = None
+    ) -> Dict:
+        return await self.db.run_sync(
+            lambda db: ReportService(db).get_monthly_revenue(clinic_id, year, month)
         )
 
-        return {
-            "total_patients": total_patients,
-            "total_appointments": total_appointments,
-            "today_appointments": today_appointments,
-            "upcoming_appointments": upcoming_appointments,
-        }
+    async def get_patient_visit_history(self, patient_id: str) -> Dict:
+        return await self.db.run_sync(
+            lambda db: ReportService(db).get_patient_visit_history(patient_id)
+        )
+
+    async def get_clinic_stats(
+        self, clinic_id: str, use_cache: bool = True, version: Optional[int] = None
+    ) -> Dict:
+        return await self.db.run_sync(
+            lambda db: ReportService(db).get_clinic_stats(clinic_id, use_cache, version)
+        )
@@ -59,7 +59,7 @@ class SMSService:
         self, clinic_id: str, target_date: date, hours_ahead: int = 24
     ) -> List[Appointment]:
         """Appointments that should receive a reminder (scheduled, not yet reminded)."""
-        with local_db.get_session() as session:
+        with local_db.get_session(readonly=True) as session:
             start = datetime.combine(target_date, datetime.min.time())
             end = start + timedelta(hours=hours_ahead)
             appointments = (
@@ -0,0 +1,51 @@
+"""Sync log browsing for troubleshooting - گزارش همگام‌سازی."""
+
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+
+from app.database.models import SyncLog
+from .pagination import keyset_page
+
+
+class SyncLogService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_logs_page(
+        self,
+        entity_type: Optional[str] = None,
+        entity_id: Optional[str] = None,
+        status: Optional[str] = None,
+        sync_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+    ) -> Dict:
+        """Log rows matching the given filters, newest first by
+        (created_at, id), one page at a time (see
+        services.pagination.keyset_page)."""
+        query = self.db.query(SyncLog)
+        if entity_type:
+            query = query.filter(SyncLog.entity_type == entity_type)
+        if entity_id:
+            query = query.filter(SyncLog.entity_id == entity_id)
+        if status:
+            query = query.filter(SyncLog.status == status)
+        if sync_id:
+            query = query.filter(SyncLog.sync_id == sync_id)
+        if since:
+            query = query.filter(SyncLog.created_at >= since)
+        if until:
+            query = query.filter(SyncLog.created_at < until)
+
+        return keyset_page(
+            query,
+            (SyncLog.created_at, SyncLog.id),
+            limit,
+            cursor,
+            count_query=query if include_total else None,
+            descending=True,
+        )
@@ -0,0 +1,309 @@
+"""Shared test setup.
+
+The code imports itself as the ``app`` package (the checkout directory is
+named app). When it is checked out under another name, the checkout is
+registered as ``app`` here. Settings are read at import time, so the
+throwaway database path is set before anything from app is imported.
+"""
+
+import asyncio
+import functools
+import importlib.util
+import json
+import os
+import re
+import sys
+import tempfile
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+from urllib.parse import parse_qsl
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_tmp_dir = tempfile.mkdtemp(prefix="clinic-crm-tests-")
+os.environ["LOCAL_DB_PATH"] = os.path.join(_tmp_dir, "clinic.db")
+os.environ["SUPABASE_URL"] = ""
+os.environ["SUPABASE_ANON_KEY"] = ""
+
+if ROOT.name != "app" and "app" not in sys.modules:
+    _spec = importlib.util.spec_from_file_location(
+        "app", ROOT / "__init__.py", submodule_search_locations=[str(ROOT)]
+    )
+    sys.modules["app"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(sys.modules["app"])
+elif str(ROOT.parent) not in sys.path:
+    sys.path.insert(0, str(ROOT.parent))
+
+from app.database import remote_db as remote_db_module  # noqa: E402
+from app.database.local_db import local_db  # noqa: E402
+from app.database.models import (  # noqa: E402
+    Appointment,
+    Clinic,
+    Patient,
+    SyncOutbox,
+    SyncState,
+)
+from app.database.remote_db import remote_db  # noqa: E402
+from app.database.sync_state import SYNCED_MODELS  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    from app.api.server import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    """A write session on the test database."""
+    with local_db.get_session() as session:
+        yield session
+
+
+@pytest.fixture
+def clinic(db):
+    clinic = Clinic(name="Test clinic")
+    db.add(clinic)
+    db.commit()
+    return clinic
+
+
+@pytest.fixture
+def make_patients(db, clinic):
+    """Adds ``count`` patients to the test clinic."""
+
+    def make(count: int):
+        patients = [
+            Patient(
+                clinic_id=clinic.id,
+                national_id=uuid.uuid4().hex[:10],
+                first_name=f"نام{i}",
+                last_name=f"خانوادگی{i}",
+                mobile=f"0912{i:07d}",
+            )
+            for i in range(count)
+        ]
+        db.add_all(patients)
+        db.commit()
+        return patients
+
+    return make
+
+
+@pytest.fixture
+def make_appointments(db, clinic, make_patients):
+    """Adds ``count`` scheduled appointments, each for a new patient, 15
+    minutes apart from ``start`` (tomorrow 09:00 by default)."""
+
+    def make(count: int, start: datetime = None):
+        start = start or datetime.combine(date.today() + timedelta(days=1), time(9))
+        appointments = [
+            Appointment(
+                clinic_id=clinic.id,
+                patient_id=patient.id,
+                appointment_date=start + timedelta(minutes=15 * i),
+                visit_fee=150000,
+            )
+            for i, patient in enumerate(make_patients(count))
+        ]
+        db.add_all(appointments)
+        db.commit()
+        return appointments
+
+    return make
+
+
+@pytest.fixture
+def patient_history(db, clinic, make_patients):
+    """Adds ``count`` past visits of one patient, returns the patient id."""
+    patient = make_patients(1)[0]
+
+    def add(count: int) -> str:
+        start = datetime.utcnow() - timedelta(days=count + 1)
+        db.add_all(
+            Appointment(
+                clinic_id=clinic.id,
+                patient_id=patient.id,
+                appointment_date=start + timedelta(days=i),
+            )
+            for i in range(count)
+        )
+        db.commit()
+        return patient.id
+
+    return add
+
+
+_QUOTED = r'"((?:[^"\\]|\\.)*)"'
+_KEYSET = re.compile(
+    rf"\(updated_at\.gt\.{_QUOTED},"
+    rf"and\(updated_at\.eq\.{_QUOTED},id\.gt\.{_QUOTED}\),"
+    r"updated_at\.is\.null\)"
+)
+
+
+def _unquote(value: str) -> str:
+    return re.sub(r"\\(.)", r"\1", value)
+
+
+def _timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class FakeRemote:
+    """PostgREST-like tables in memory.
+
+    Like the production setup (database/supabase_sync.sql), updated_at is
+    stamped from the server clock on every write. Like PostgreSQL, an
+    upsert checks NOT NULL on the proposed insert row before resolving the
+    conflict, so a partial row fails with 400 even if the id exists.
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, Dict[str, Dict[str, Any]]] = {
+            model.__tablename__: {} for model in SYNCED_MODELS
+        }
+        self.not_null = {
+            model.__tablename__: [
+                column.name
+                for column in model.__table__.columns
+                if not column.nullable and not column.primary_key
+            ]
+            for model in SYNCED_MODELS
+        }
+        self.requests: List[httpx.Request] = []
+        self.delay = 0.0
+        self.before_get = None
+        self.reachable = True
+        # Upserts containing one of these ids are rejected (400)
+        self.reject_ids = set()
+
+    def stamp(self) -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def put(self, table: str, row: Dict[str, Any], updated_at: str = None) -> None:
+        """A row written by another device."""
+        stamp = updated_at or self.stamp()
+        self.tables[table][row["id"]] = {**row, "updated_at": stamp}
+
+    def bodies(self, method: str) -> List[Any]:
+        return [
+            json.loads(request.content)
+            for request in self.requests
+            if request.method == method and request.content
+        ]
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if not self.reachable:
+            raise httpx.ConnectError("unreachable", request=request)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        table = request.url.path.rsplit("/", 1)[-1]
+        params = dict(parse_qsl(request.url.query.decode()))
+        if request.method == "GET":
+            if self.before_get is not None:
+                self.before_get(table)
+            return self._get(table, params)
+        body = json.loads(request.content)
+        if request.method == "POST":
+            return self._upsert(table, body)
+        if request.method == "PATCH":
+            return self._patch(table, params, body, request.headers.get("prefer", ""))
+        return httpx.Response(405)
+
+    def _get(self, table: str, params: Dict[str, str]) -> httpx.Response:
+        # Like PostgreSQL, a null updated_at sorts last
+        stamped = sorted(
+            (row for row in self.tables[table].values() if row["updated_at"]),
+            key=lambda row: (_timestamp(row["updated_at"]), row["id"]),
+        )
+        unstamped = sorted(
+            (row for row in self.tables[table].values() if not row["updated_at"]),
+            key=lambda row: row["id"],
+        )
+        if "or" in params:
+            updated_at, _, entity_id = _KEYSET.fullmatch(params["or"]).groups()
+            after = (_timestamp(_unquote(updated_at)), _unquote(entity_id))
+            stamped = [
+                row
+                for row in stamped
+                if (_timestamp(row["updated_at"]), row["id"]) > after
+            ]
+        rows = stamped + unstamped
+        rows = rows[: int(params["limit"])]
+        if params.get("select", "*") != "*":
+            fields = params["select"].split(",")
+            rows = [{field: row[field] for field in fields} for row in rows]
+        return httpx.Response(200, json=rows)
+
+    def _upsert(self, table: str, rows: List[Dict[str, Any]]) -> httpx.Response:
+        if any(row["id"] in self.reject_ids for row in rows):
+            return httpx.Response(
+                400, json={"code": "23514", "message": "check constraint violated"}
+            )
+        for row in rows:
+            missing = [name for name in self.not_null[table] if row.get(name) is None]
+            if missing:
+                return httpx.Response(
+                    400, json={"code": "23502", "message": f"null value in {missing}"}
+                )
+        for row in rows:
+            stored = self.tables[table].setdefault(row["id"], {})
+            stored.update(row, updated_at=self.stamp())
+        return httpx.Response(201)
+
+    def _patch(
+        self, table: str, params: Dict[str, str], values: Dict[str, Any], prefer: str
+    ) -> httpx.Response:
+        operator, _, argument = params["id"].partition(".")
+        if operator == "in":
+            ids = [_unquote(quoted) for quoted in re.findall(_QUOTED, argument)]
+        else:
+            ids = [argument]
+        updated = []
+        for entity_id in ids:
+            stored = self.tables[table].get(entity_id)
+            if stored is not None:
+                stored.update(values, updated_at=self.stamp())
+                updated.append({"id": entity_id})
+        if "return=representation" in prefer:
+            return httpx.Response(200, json=updated)
+        return httpx.Response(204)
+
+
+@pytest.fixture
+def remote(monkeypatch):
+    """Points remote_db at a FakeRemote; sync starts from scratch."""
+    fake = FakeRemote()
+    transport = httpx.MockTransport(fake.handle)
+    monkeypatch.setattr(
+        remote_db_module.httpx,
+        "AsyncClient",
+        functools.partial(httpx.AsyncClient, transport=transport),
+    )
+    monkeypatch.setattr(remote_db, "base_url", "http://remote.test/rest/v1")
+    monkeypatch.setattr(remote_db, "_client", None)
+    with local_db.get_session() as session:
+        session.query(SyncState).delete()
+        session.query(SyncOutbox).delete()
+    return fake
+
+
+@pytest.fixture
+def clinic_id():
+    """A clinic, with no session left open: sync needs the write
+    connection."""
+    with local_db.get_session() as session:
+        clinic = Clinic(name="Sync test clinic")
+        session.add(clinic)
+        session.flush()
+        return clinic.id
@@ -0,0 +1,18 @@
+"""Conditional GETs (api.caching)."""
+
+from email.utils import formatdate
+
+
+def test_write_in_the_same_second_is_not_reported_unmodified(client, db, clinic):
+    url = f"/api/clinic/{clinic.id}"
+    first = client.get(url)
+    assert "Last-Modified" not in first.headers
+
+    clinic.name = "Renamed clinic"
+    db.commit()
+    second = client.get(url, headers={"If-Modified-Since": formatdate(usegmt=True)})
+
+    assert second.status_code == 200
+    assert second.json()["name"] == "Renamed clinic"
+    third = client.get(url, headers={"If-None-Match": second.headers["ETag"]})
+    assert third.status_code == 304
@@ -0,0 +1,74 @@
+"""Streaming exports."""
+
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from app.api import exports
+from app.api.routes.patients import export_patients
+from app.config import settings
+from app.database.local_db import local_db
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(exports.settings, "export_chunk_size", 3)
+
+
+def test_export_reads_every_row_once_in_keyset_chunks(
+    client, clinic, make_patients, small_chunks
+):
+    make_patients(10)
+    clinic_id = clinic.id
+
+    response = client.get(f"/api/patients/export?clinic_id={clinic_id}&format=csv")
+    header, *rows = csv.reader(io.StringIO(response.content.decode("utf-8-sig")))
+    assert header[:3] == ["id", "clinic_id", "national_id"]
+    last, first = header.index("last_name"), header.index("first_name")
+    names = [(row[last], row[first]) for row in rows]
+    assert len(rows) == len({row[0] for row in rows}) == 10
+    assert names == sorted(names)
+
+
+def test_descending_export_in_keyset_chunks(client, patient_history, small_chunks):
+    patient_id = patient_history(7)
+    response = client.get(
+        f"/api/reports/patient/{patient_id}/history/export?format=ndjson"
+    )
+    dates = [json.loads(line)["date"] for line in response.text.splitlines()]
+    assert len(dates) == 7
+    assert dates == sorted(dates, reverse=True)
+
+
+def test_slow_exports_do_not_hold_read_connections(
+    client, clinic, make_patients, small_chunks
+):
+    make_patients(10)
+    clinic_id = clinic.id
+    pool = local_db.read_engine.pool
+
+    async def start_downloads(count: int):
+        # Clients that read the header and a first chunk, then stall
+        bodies = [
+            export_patients(clinic_id, "ndjson").body_iterator for _ in range(count)
+        ]
+        for body in bodies:
+            assert await body.__anext__()
+        return bodies
+
+    async def main():
+        bodies = await start_downloads(settings.db_read_pool_size + 1)
+        try:
+            assert pool.checkedout() == 0
+            response = await asyncio.to_thread(
+                client.get, f"/api/patients/?clinic_id={clinic_id}"
+            )
+            assert response.status_code == 200
+        finally:
+            for body in bodies:
+                await body.aclose()
+
+    asyncio.run(main())
@@ -0,0 +1,249 @@
+"""Query shape regressions: statement counts of the list paths and the
+query plans of the hot service queries."""
+
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Iterator, List, Tuple
+
+import pytest
+from sqlalchemy import event
+
+from app.api.routes.appointments import AppointmentResponse
+from app.database.local_db import local_db
+from app.services.appointment_service import AppointmentService
+from app.services.patient_service import PatientService
+from app.services.report_service import ReportService
+from app.services.sms_service import SMSService
+
+
+@contextmanager
+def count_statements() -> Iterator[List[Tuple[str, Any]]]:
+    """Collects the (statement, parameters) run on either engine."""
+    statements: List[Tuple[str, Any]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+
+    engines = {local_db.engine, local_db.read_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _tomorrow() -> str:
+    return (date.today() + timedelta(days=1)).isoformat()
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/api/appointments/date/{clinic_id}/{tomorrow}",
+        "/api/appointments/upcoming/{clinic_id}",
+    ],
+)
+def test_clinic_list_endpoints_are_not_n_plus_one(
+    client, clinic, make_appointments, path
+):
+    url = path.format(clinic_id=clinic.id, tomorrow=_tomorrow())
+    make_appointments(2)
+    with count_statements() as few:
+        assert len(client.get(url).json()) == 2
+    make_appointments(20)
+    with count_statements() as many:
+        assert len(client.get(url).json()) == 22
+
+    assert len(many) == len(few)
+
+
+def test_patient_history_endpoint_is_not_n_plus_one(client, patient_history):
+    patient_id = patient_history(2)
+    url = f"/api/appointments/patient/{patient_id}"
+    with count_statements() as few:
+        assert len(client.get(url).json()) == 2
+    patient_history(20)
+    with count_statements() as many:
+        assert len(client.get(url).json()) == 22
+
+    assert len(many) == len(few)
+
+
+@pytest.mark.parametrize("load", ["selectin", "joined"])
+def test_service_lists_load_patients_in_batch(db, clinic, make_appointments, load):
+    make_appointments(15)
+    clinic_id = clinic.id
+    service = AppointmentService(db)
+    tomorrow = date.today() + timedelta(days=1)
+    queries = {
+        "by date": lambda: service.get_appointments_by_date(
+            clinic_id, tomorrow, load=load
+        ),
+        "upcoming": lambda: service.get_upcoming_appointments(clinic_id, load=load),
+    }
+    for name, query in queries.items():
+        db.expire_all()
+        with count_statements() as statements:
+            # What the list endpoints and AppointmentWidget do per row
+            names = [
+                AppointmentResponse.from_orm_with_patient(apt).patient_name
+                for apt in query()
+            ]
+        assert len(names) == 15 and all(names), name
+        assert len(statements) == (2 if load == "selectin" else 1), name
+
+
+def test_service_patient_history_loads_patients_in_batch(db, patient_history):
+    patient_id = patient_history(15)
+    service = AppointmentService(db)
+    for query in (
+        lambda: service.get_patient_appointments(patient_id),
+        lambda: service.get_patient_appointments_page(patient_id)["items"],
+    ):
+        db.expire_all()
+        with count_statements() as statements:
+            names = [
+                AppointmentResponse.from_orm_with_patient(apt).patient_name
+                for apt in query()
+            ]
+        assert len(names) == 15 and all(names)
+        assert len(statements) == 2
+
+
+def query_plans(statements: List[Tuple[str, Any]]) -> List[List[str]]:
+    """EXPLAIN QUERY PLAN details of each captured statement."""
+    with local_db.read_engine.connect() as conn:
+        return [
+            [
+                row.detail
+                for row in conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+            ]
+            for statement, parameters in statements
+            if statement.lstrip().upper().startswith(("SELECT", "WITH"))
+        ]
+
+
+def assert_uses_indexes(plans: List[List[str]], *indexes) -> None:
+    """Every step on a data table is an index search, and each of
+    ``indexes`` is used (a tuple: any one of them)."""
+    assert plans
+    details = [detail for plan in plans for detail in plan]
+    for detail in details:
+        if detail.startswith("SCAN") and "CONSTANT ROW" not in detail:
+            raise AssertionError(f"full scan: {detail} in {details}")
+    for index in indexes:
+        alternatives = index if isinstance(index, tuple) else (index,)
+        assert any(
+            name in detail for name in alternatives for detail in details
+        ), (index, details)
+
+
+_TODAY = date.today()
+_TOMORROW = _TODAY + timedelta(days=1)
+
+SERVICE_QUERIES = {
+    "appointments by date": (
+        lambda db, ids: AppointmentService(db).get_appointments_by_date(
+            ids["clinic"], _TOMORROW
+        ),
+        ["ix_appointments_revenue"],
+    ),
+    "upcoming appointments": (
+        lambda db, ids: AppointmentService(db).get_upcoming_appointments(
+            ids["clinic"]
+        ),
+        ["ix_appointments_clinic_status_date_active"],
+    ),
+    "availability": (
+        lambda db, ids: AppointmentService(db).check_availability(
+            ids["clinic"], datetime.combine(_TOMORROW, datetime.min.time())
+        ),
+        ["ix_appointments_clinic_status_date_active"],
+    ),
+    "patient appointments": (
+        lambda db, ids: AppointmentService(db).get_patient_appointments_page(
+            ids["patient"], include_total=True
+        ),
+        ["ix_appointments_patient_date_active"],
+    ),
+    "reminders": (
+        lambda db, ids: SMSService().get_appointments_for_reminder(
+            ids["clinic"], _TOMORROW
+        ),
+        ["ix_appointments_clinic_status_date_active"],
+    ),
+    "daily revenue": (
+        lambda db, ids: ReportService(db).get_daily_revenue(ids["clinic"], _TOMORROW),
+        ["sqlite_autoindex_daily_revenue_rollup_1"],
+    ),
+    "monthly revenue": (
+        lambda db, ids: ReportService(db).get_monthly_revenue(ids["clinic"]),
+        ["sqlite_autoindex_daily_revenue_rollup_1"],
+    ),
+    "clinic stats": (
+        lambda db, ids: ReportService(db).get_clinic_stats(
+            ids["clinic"], use_cache=False
+        ),
+        # Both cover the counted columns, the planner may take either
+        [
+            ("ix_appointments_revenue", "ix_appointments_clinic_status_date_active"),
+            "ix_patients_clinic_active",
+        ],
+    ),
+    "visit history": (
+        lambda db, ids: ReportService(db).get_patient_visit_history(ids["patient"]),
+        ["ix_appointments_patient_date_active"],
+    ),
+    "patient list": (
+        lambda db, ids: PatientService(db).get_patients_page(
+            ids["clinic"], include_total=True
+        ),
+        ["ix_patients_clinic_name_active", "ix_patients_clinic_active"],
+    ),
+    "patient stats": (
+        lambda db, ids: PatientService(db).get_patient_stats(ids["clinic"]),
+        ["ix_patients_clinic_active"],
+    ),
+}
+
+
+@pytest.mark.parametrize("name", SERVICE_QUERIES)
+def test_service_queries_use_indexes(db, clinic, make_appointments, name):
+    appointments = make_appointments(5)
+    ids = {"clinic": clinic.id, "patient": appointments[0].patient_id}
+    query, indexes = SERVICE_QUERIES[name]
+    with count_statements() as statements:
+        query(db, ids)
+
+    assert_uses_indexes(query_plans(statements), *indexes)
+
+
+def test_short_search_uses_both_name_indexes(db, clinic):
+    service = PatientService(db)
+    for i, (first_name, last_name) in enumerate(
+        [("علی", "رضایی"), ("رضا", "علوی"), ("مریم", "کریمی")]
+    ):
+        service.create_patient(
+            clinic_id=clinic.id,
+            national_id=f"{clinic.id[:8]}{i}",
+            first_name=first_name,
+            last_name=last_name,
+        )
+    clinic_id = clinic.id
+
+    with count_statements() as statements:
+        found = service.search_patients(clinic_id, "عل")
+
+    assert sorted(p.last_name for p in found) == ["رضایی", "علوی"]
+    plans = query_plans(statements)
+    assert_uses_indexes(plans)
+    details = [detail for plan in plans for detail in plan]
+    for name in ("first_name", "last_name"):
+        assert (
+            f"ix_patients_search_{name} (clinic_id=? AND search_{name}>? "
+            f"AND search_{name}<?)"
+        ) in " ".join(details), details
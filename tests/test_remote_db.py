@@ -0,0 +1,36 @@
+"""RemoteDatabase's HTTP client handling."""
+
+import asyncio
+
+from app.database.remote_db import remote_db
+
+
+def test_client_of_a_previous_loop_is_closed(remote):
+    async def probe():
+        await remote_db.has_updates("patients")
+        return remote_db._client
+
+    first = asyncio.run(probe())  # the loop ends without closing it
+    assert not first.is_closed
+    second = asyncio.run(probe())
+
+    assert second is not first
+    assert first.is_closed
+    asyncio.run(remote_db.close())
+
+
+def test_client_of_a_running_loop_is_closed_on_that_loop(remote):
+    async def probe():
+        await remote_db.has_updates("patients")
+        return remote_db._client
+
+    async def main():
+        first = await probe()
+        # Another thread's loop, like the sync scheduler's, uses the client
+        second = await asyncio.to_thread(asyncio.run, probe())
+        assert second is not first
+        await asyncio.sleep(0.05)
+        assert first.is_closed
+
+    asyncio.run(main())
+    asyncio.run(remote_db.close())
@@ -0,0 +1,56 @@
+"""Report endpoints."""
+
+import asyncio
+import uuid
+
+from app.database.local_db import local_db
+from app.database.remote_db import remote_db
+from app.database.sync import sync_engine
+from app.services.patient_service import PatientService
+
+
+def _add_patient_elsewhere(clinic_id: str) -> None:
+    """A write that does not go through the services (sync, another app
+    instance), so nothing in this process invalidates caches."""
+    with local_db.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO patients (id, clinic_id, national_id, first_name, "
+            "last_name, sync_status) VALUES (?, ?, ?, 'a', 'b', 'synced')",
+            (str(uuid.uuid4()), clinic_id, uuid.uuid4().hex[:10]),
+        )
+
+
+def test_stats_body_matches_its_etag(client, clinic, make_patients):
+    clinic_id = clinic.id
+    make_patients(2)
+    url = f"/api/reports/stats?clinic_id={clinic_id}"
+    first = client.get(url)
+    assert first.json()["total_patients"] == 2
+
+    _add_patient_elsewhere(clinic_id)
+    second = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json()["total_patients"] == 3
+
+
+def test_stats_etag_survives_an_upload(client, remote, clinic_id):
+    with local_db.get_session() as session:
+        PatientService(session).create_patient(
+            clinic_id=clinic_id, national_id=clinic_id[:10], first_name="a", last_name="b"
+        )
+    url = f"/api/reports/stats?clinic_id={clinic_id}"
+    etag = client.get(url).headers["ETag"]
+
+    async def upload():
+        try:
+            return await sync_engine.sync_to_remote()
+        finally:
+            await remote_db.close()
+
+    assert asyncio.run(upload())
+
+    # Only the sync bookkeeping of the rows changed
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
@@ -0,0 +1,277 @@
+"""Sync against FakeRemote, the stand-in for the Supabase REST API (see
+conftest)."""
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from app.database import remote_db as remote_db_module
+from app.database.local_db import local_db
+from app.database.models import Patient, SyncLog, SyncOutbox
+from app.database.remote_db import RemoteRequestError, remote_db
+from app.database.sync import sync_engine
+from app.services.patient_service import PatientService
+
+def run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await remote_db.close()
+
+    return asyncio.run(main())
+
+
+def _remote_patient(clinic_id: str, national_id: str) -> Dict[str, Any]:
+    return {
+        "id": f"remote-{national_id}",
+        "clinic_id": clinic_id,
+        "national_id": national_id,
+        "first_name": "سارا",
+        "last_name": "احمدی",
+        "deleted_at": None,
+    }
+
+
+def _local_patient(patient_id: str) -> Optional[Patient]:
+    with local_db.get_session(readonly=True) as session:
+        patient = session.get(Patient, patient_id)
+        if patient is not None:
+            session.expunge(patient)
+        return patient
+
+
+def test_uploads_leave_updated_at_to_the_server(remote, clinic_id):
+    with local_db.get_session() as session:
+        patient_id = PatientService(session).create_patient(
+            clinic_id=clinic_id, national_id="5000000001", first_name="a", last_name="b"
+        ).id
+    assert run(sync_engine.sync_to_remote())
+    with local_db.get_session() as session:
+        PatientService(session).update_patient(patient_id, mobile="09120000001")
+    assert run(sync_engine.sync_to_remote())
+
+    bodies = remote.bodies("POST") + remote.bodies("PATCH")
+    rows = [
+        row for body in bodies for row in (body if isinstance(body, list) else [body])
+    ]
+    assert any(row.get("id") == patient_id for row in rows)
+    assert all("updated_at" not in row for row in rows)
+    assert remote.tables["patients"][patient_id]["mobile"] == "09120000001"
+
+
+def test_download_picks_up_rows_committed_behind_the_watermark(remote, clinic_id):
+    first = _remote_patient(clinic_id, "5000000002")
+    remote.put("patients", first)
+    assert run(sync_engine.sync_from_remote())
+    assert _local_patient(first["id"]) is not None
+
+    # A transaction that took its stamp before `first` but committed after
+    # the download above
+    late = _remote_patient(clinic_id, "5000000003")
+    stamp = datetime.fromisoformat(remote.tables["patients"][first["id"]]["updated_at"])
+    remote.put("patients", late, updated_at=(stamp - timedelta(seconds=1)).isoformat())
+    assert run(sync_engine.sync_from_remote())
+
+    assert _local_patient(late["id"]) is not None
+
+
+def _create_patients(clinic_id: str, count: int) -> List[str]:
+    with local_db.get_session() as session:
+        service = PatientService(session)
+        return [
+            service.create_patient(
+                clinic_id=clinic_id,
+                national_id=f"6{clinic_id[:4]}{i:05d}",
+                first_name="a",
+                last_name="b",
+                medical_notes="سابقه " * 200,
+            ).id
+            for i in range(count)
+        ]
+
+
+def _outbox_size() -> int:
+    with local_db.get_session(readonly=True) as session:
+        return session.query(SyncOutbox).count()
+
+
+def test_column_changes_are_patched_not_upserted(remote, clinic_id):
+    ids = _create_patients(clinic_id, 3)
+    assert run(sync_engine.sync_to_remote())
+    remote.requests.clear()
+
+    with local_db.get_session() as session:
+        service = PatientService(session)
+        service.update_patient(ids[0], address="قم")
+        service.update_patient(ids[1], address="قم")
+        service.update_patient(ids[2], mobile="09121111111")
+    assert run(sync_engine.sync_to_remote())
+
+    assert remote.bodies("POST") == []
+    assert sorted(remote.bodies("PATCH"), key=str) == [
+        {"address": "قم"},
+        {"mobile": "09121111111"},
+    ]
+    assert [remote.tables["patients"][i]["address"] for i in ids] == ["قم", "قم", None]
+    assert remote.tables["patients"][ids[2]]["medical_notes"].startswith("سابقه")
+    assert _outbox_size() == 0
+    assert all(_local_patient(i).sync_status == "synced" for i in ids)
+
+
+def test_update_of_row_missing_remotely_sends_whole_row(remote, clinic_id):
+    (patient_id,) = _create_patients(clinic_id, 1)
+    assert run(sync_engine.sync_to_remote())
+    del remote.tables["patients"][patient_id]
+
+    with local_db.get_session() as session:
+        PatientService(session).update_patient(patient_id, mobile="09122222222")
+    assert run(sync_engine.sync_to_remote())
+
+    recreated = remote.tables["patients"][patient_id]
+    assert recreated["mobile"] == "09122222222"
+    assert recreated["first_name"] == "a"
+    assert _outbox_size() == 0
+
+
+def test_download_keeps_local_edit_made_while_it_runs(remote, clinic_id):
+    (patient_id,) = _create_patients(clinic_id, 1)
+    assert run(sync_engine.sync_to_remote())
+    # Another device renames the patient
+    remote.put("patients", {**remote.tables["patients"][patient_id], "first_name": "سارا"})
+
+    def edit_locally(table):
+        if table == "patients":
+            remote.before_get = None
+            with local_db.get_session() as session:
+                PatientService(session).update_patient(patient_id, mobile="09123333333")
+
+    remote.before_get = edit_locally
+    assert run(sync_engine.sync_from_remote())
+
+    local = _local_patient(patient_id)
+    assert local.mobile == "09123333333"
+    assert local.sync_status == "pending"
+    assert _outbox_size() == 1
+
+    assert run(sync_engine.sync_to_remote())
+    assert run(sync_engine.sync_from_remote())
+    assert remote.tables["patients"][patient_id]["mobile"] == "09123333333"
+    local = _local_patient(patient_id)
+    assert (local.first_name, local.mobile) == ("سارا", "09123333333")
+    assert local.sync_status == "synced"
+
+
+def test_local_writes_do_not_wait_for_a_slow_remote(remote, clinic_id, monkeypatch):
+    monkeypatch.setattr(sync_engine, "sync_enabled", True)
+    monkeypatch.setattr(sync_engine, "batch_size", 50)
+    monkeypatch.setattr(remote_db_module.settings, "sync_page_size", 50)
+    ids = _create_patients(clinic_id, 200)
+    for i in range(200):
+        remote.put("patients", _remote_patient(clinic_id, f"7{clinic_id[:4]}{i:05d}"))
+    remote.delay = 0.2
+
+    sync = threading.Thread(target=lambda: run(sync_engine.perform_sync()))
+    sync.start()
+    latencies = []
+    while sync.is_alive():
+        started = time.perf_counter()
+        with local_db.get_session() as session:
+            PatientService(session).update_patient(
+                ids[len(latencies) % len(ids)], address=f"خیابان {len(latencies)}"
+            )
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.01)
+    sync.join()
+
+    # Several writes per remote round trip, none held up by one
+    assert len(latencies) > 20
+    assert max(latencies) < remote.delay
+
+
+def test_failed_batch_stays_queued_and_is_logged(remote, clinic_id, monkeypatch):
+    monkeypatch.setattr(sync_engine, "batch_size", 3)
+    ids = _create_patients(clinic_id, 6)
+    remote.reject_ids = {ids[4]}
+
+    assert not run(sync_engine.sync_to_remote(sync_id="run-1"))
+
+    # One bulk upsert per batch, the second one rejected as a whole
+    assert [len(body) for body in remote.bodies("POST")][-2:] == [3, 3]
+    assert set(remote.tables["patients"]) == set(ids[:3])
+    assert [_local_patient(i).sync_status for i in ids] == ["synced"] * 3 + [
+        "failed"
+    ] * 3
+    with local_db.get_session(readonly=True) as session:
+        queued = {
+            entry.entity_id
+            for entry in session.query(SyncOutbox).filter_by(entity_type="patients")
+        }
+        logs = {
+            log.entity_id: log
+            for log in session.query(
+                SyncLog.entity_id,
+                SyncLog.operation,
+                SyncLog.status,
+                SyncLog.error_message,
+            ).filter(SyncLog.sync_id == "run-1", SyncLog.entity_type == "patients")
+        }
+    assert queued == set(ids[3:])
+    assert set(logs) == set(ids)
+    assert {(logs[i].status, logs[i].error_message) for i in ids[:3]} == {
+        ("success", None)
+    }
+    assert {(logs[i].status, logs[i].error_message) for i in ids[3:]} == {
+        ("failed", "Failed to sync to remote")
+    }
+    assert all(logs[i].operation == "upload" for i in ids)
+
+    remote.reject_ids = set()
+    assert run(sync_engine.sync_to_remote())
+    assert set(remote.tables["patients"]) == set(ids)
+    assert all(_local_patient(i).sync_status == "synced" for i in ids)
+
+
+def test_update_without_column_changes_sends_nothing(remote, clinic_id):
+    ids = _create_patients(clinic_id, 2)
+    assert run(sync_engine.sync_to_remote())
+    remote.requests.clear()
+
+    with local_db.get_session() as session:
+        PatientService(session).update_patient(ids[0], first_name="a")
+    assert _outbox_size() == 0
+
+    # An entry recorded before such updates were ignored
+    with local_db.get_session() as session:
+        session.add(
+            SyncOutbox(
+                entity_type="patients",
+                entity_id=ids[1],
+                operation="upsert",
+                changed_columns=",",
+            )
+        )
+    assert run(sync_engine.sync_to_remote())
+
+    assert remote.requests == []
+    assert _outbox_size() == 0
+    assert _local_patient(ids[1]).sync_status == "synced"
+
+
+def test_rows_the_server_did_not_stamp_are_reported(remote, clinic_id, caplog):
+    remote.put("patients", _remote_patient(clinic_id, "5000000004"))
+    assert run(sync_engine.sync_from_remote())
+    # Written to a server without the triggers of supabase_sync.sql
+    unstamped = _remote_patient(clinic_id, "5000000005")
+    remote.tables["patients"][unstamped["id"]] = {**unstamped, "updated_at": None}
+
+    with pytest.raises(RemoteRequestError, match="supabase_sync.sql"):
+        run(remote_db.has_updates("patients", ("2100-01-01T00:00:00+00:00", "")))
+    assert not run(sync_engine.sync_from_remote())
+
+    assert "null updated_at" in caplog.text
+    assert _local_patient(unstamped["id"]) is None
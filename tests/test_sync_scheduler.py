@@ -0,0 +1,131 @@
+"""The background sync scheduler, against FakeRemote (see conftest)."""
+
+import time
+
+import pytest
+
+from app.config import settings
+from app.database.local_db import local_db
+from app.database.sync import sync_engine
+from app.database.sync_scheduler import sync_scheduler
+from app.services.patient_service import PatientService
+
+DEBOUNCE = 0.3
+
+
+def wait_for(condition, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class SyncCounter:
+    """Wraps perform_sync to count calls and how many run at once."""
+
+    def __init__(self, perform_sync):
+        self._perform_sync = perform_sync
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            return await self._perform_sync(*args, **kwargs)
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def syncs(remote, monkeypatch):
+    """The app's scheduler with short delays, not started; yields the
+    perform_sync counter."""
+    counter = SyncCounter(sync_engine.perform_sync)
+    monkeypatch.setattr(sync_engine, "perform_sync", counter)
+    monkeypatch.setattr(sync_engine, "sync_enabled", True)
+    monkeypatch.setattr(settings, "auto_sync_enabled", True)
+    monkeypatch.setattr(settings, "remote_max_retries", 0)
+    monkeypatch.setattr(sync_scheduler, "debounce", DEBOUNCE)
+    monkeypatch.setattr(sync_scheduler, "interval", 60)
+    monkeypatch.setattr(sync_scheduler, "max_backoff", 3)
+    monkeypatch.setattr(sync_scheduler, "failures", 0)
+    monkeypatch.setattr(sync_scheduler, "next_run_at", None)
+    monkeypatch.setattr(sync_scheduler, "last_run_at", None)
+    try:
+        yield counter
+    finally:
+        sync_scheduler.stop()
+
+
+def _failed(times: int) -> bool:
+    # The retry is scheduled right after the failure is counted
+    return sync_scheduler.failures == times and sync_scheduler.next_run_at is not None
+
+
+def _seconds_to_next_run() -> float:
+    return (sync_scheduler.next_run_at - sync_scheduler.last_run_at).total_seconds()
+
+
+def test_cycle_without_work_is_skipped(remote, syncs):
+    sync_scheduler.start()
+    wait_for(lambda: sync_scheduler.last_run_at and sync_scheduler.next_run_at)
+
+    assert syncs.calls == 0
+    assert sync_scheduler.last_result == {"to_remote": True, "from_remote": True}
+    # Only the "anything new?" probes went out
+    assert {request.method for request in remote.requests} == {"GET"}
+    assert _seconds_to_next_run() == pytest.approx(60, abs=1)
+
+
+def test_burst_of_edits_syncs_once_after_the_debounce(remote, syncs, clinic_id):
+    with local_db.get_session() as session:
+        patient_id = PatientService(session).create_patient(
+            clinic_id=clinic_id, national_id="8000000001", first_name="a", last_name="b"
+        ).id
+    sync_scheduler.start()
+    wait_for(lambda: syncs.calls == 1 and not syncs.active)
+
+    for i in range(5):
+        with local_db.get_session() as session:
+            PatientService(session).update_patient(patient_id, address=f"پلاک {i}")
+    assert syncs.calls == 1
+    wait_for(lambda: syncs.calls == 2 and not syncs.active)
+    time.sleep(2 * DEBOUNCE)
+
+    assert syncs.calls == 2
+    assert remote.tables["patients"][patient_id]["address"] == "پلاک 4"
+    assert sync_scheduler.status()["queue_depth"] == 0
+
+
+def test_unreachable_remote_backs_off(remote, syncs):
+    remote.reachable = False
+    sync_scheduler.start()
+    wait_for(lambda: _failed(1))
+    assert _seconds_to_next_run() == pytest.approx(2, abs=0.2)
+
+    # Local edits do not bring the retry forward while backing off
+    sync_scheduler.notify_change()
+    assert _seconds_to_next_run() == pytest.approx(2, abs=0.2)
+
+    wait_for(lambda: _failed(2))
+    assert _seconds_to_next_run() == pytest.approx(3, abs=0.2)  # max_backoff
+
+    remote.reachable = True
+    result = sync_scheduler.sync_now_blocking()
+    assert result == {"to_remote": True, "from_remote": True}
+    assert sync_scheduler.failures == 0
+
+
+def test_manual_sync_waits_for_the_scheduled_one(remote, syncs, clinic_id):
+    remote.delay = 0.2
+    sync_scheduler.start()
+    wait_for(lambda: syncs.active == 1)
+
+    result = sync_scheduler.sync_now_blocking()
+
+    assert result["to_remote"] and result["from_remote"]
+    assert syncs.calls == 2
+    assert syncs.max_active == 1
@@ -9,12 +9,11 @@ from PySide6.QtWidgets import (
     QStatusBar,
     QMessageBox,
 )
-from PySide6.QtCore import Qt, QTimer, QThread, Signal
+from PySide6.QtCore import Qt, QThread, Signal
 from PySide6.QtGui import QFont
-import asyncio
 
 from app.database.local_db import local_db
-from app.database.sync import sync_engine
+from app.database.sync_scheduler import sync_scheduler
 from app.config import settings
 from .widgets.patient_widget import PatientWidget
 from .widgets.appointment_widget import AppointmentWidget
@@ -29,10 +28,7 @@ class SyncRunner(QThread):
 
     def run(self):
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(sync_engine.perform_sync())
-            loop.close()
+            result = sync_scheduler.sync_now_blocking()
             self.finished.emit(result)
         except Exception as e:
             self.error.emit(str(e))
@@ -44,7 +40,6 @@ class MainWindow(QMainWindow):
         self.clinic_id = clinic_id
         self._sync_runner = None
         self.init_ui()
-        self.setup_sync()
 
     def init_ui(self):
         self.setWindowTitle(f"{settings.app_name} - نسخه {settings.app_version}")
@@ -99,12 +94,6 @@ class MainWindow(QMainWindow):
 
         return header
 
-    def setup_sync(self):
-        if settings.auto_sync_enabled and settings.app_mode in ["online", "hybrid"]:
-            self.sync_timer = QTimer()
-            self.sync_timer.timeout.connect(self.auto_sync)
-            self.sync_timer.start(settings.sync_interval_minutes * 60 * 1000)
-
     def manual_sync(self):
         if self._sync_runner and self._sync_runner.isRunning():
             return
@@ -135,20 +124,6 @@ class MainWindow(QMainWindow):
         self.update_status(f"خطا در همگام‌سازی: {message}")
         QMessageBox.critical(self, "خطا", f"خطا در همگام‌سازی:\n{message}")
 
-    def auto_sync(self):
-        if settings.app_mode not in ["online", "hybrid"]:
-            return
-        if self._sync_runner and self._sync_runner.isRunning():
-            return
-        self._sync_runner = SyncRunner()
-        self._sync_runner.finished.connect(
-            lambda r: self.update_status("همگام‌سازی خودکار انجام شد")
-        )
-        self._sync_runner.error.connect(
-            lambda m: self.update_status(f"خطا در همگام‌سازی خودکار: {m}")
-        )
-        self._sync_runner.start()
-
     def update_status(self, message: str):
         self.status_bar.showMessage(message)
 
@@ -162,6 +137,7 @@ class MainWindow(QMainWindow):
         )
 
         if reply == QMessageBox.Yes:
+            sync_scheduler.stop()
             local_db.close()
             event.accept()
         else:
@@ -82,7 +82,7 @@ class AppointmentWidget(QWidget):
         self.load_appointments()
 
     def load_appointments(self):
-        with local_db.get_session() as session:
+        with local_db.get_session(readonly=True) as session:
             service = AppointmentService(session)
             appointments = service.get_appointments_by_date(
                 self.clinic_id, self.selected_date
@@ -200,7 +200,7 @@ class AppointmentDialog(QDialog):
         layout.addRow(buttons)
 
     def load_patients(self):
-        with local_db.get_session() as session:
+        with local_db.get_session(readonly=True) as session:
             service = PatientService(session)
             patients = service.get_patients(self.clinic_id)
 
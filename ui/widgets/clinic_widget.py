@@ -75,7 +75,7 @@ class ClinicWidget(QWidget):
         layout.addStretch()
 
     def load_clinic(self):
-        with local_db.get_session() as session:
+        with local_db.get_session(readonly=True) as session:
             clinic = ClinicService(session).get_clinic(self.clinic_id)
             if clinic:
                 self.name_input.setText(clinic.name or "")
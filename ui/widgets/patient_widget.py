@@ -54,7 +54,7 @@ class PatientWidget(QWidget):
         layout.addWidget(self.table)
 
     def load_patients(self):
-        with local_db.get_session() as session:
+        with local_db.get_session(readonly=True) as session:
             service = PatientService(session)
             patients = service.get_patients(self.clinic_id)
 
@@ -83,7 +83,7 @@ class PatientWidget(QWidget):
             self.load_patients()
             return
 
-        with local_db.get_session() as session:
+        with local_db.get_session(readonly=True) as session:
             service = PatientService(session)
             patients = service.search_patients(self.clinic_id, query)
 
@@ -62,7 +62,7 @@ class ReportWidget(QWidget):
     def load_reports(self):
         report_type = self.report_type_combo.currentText()
 
-        with local_db.get_session() as session:
+        with local_db.get_session(readonly=True) as session:
             service = ReportService(session)
 
             if report_type == "امروز":